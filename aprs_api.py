@@ -0,0 +1,693 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# aprs_api.py
+#
+# The aprs.fi message API: retrieving messages and storing the new ones
+# in the database. Nothing in here touches Qt, so it can be called from
+# a worker thread.
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+from circuit_breaker import CircuitBreaker
+from concurrent.futures import CancelledError
+from datetime import datetime
+from rate_limiter import RateLimiter
+from seen_cache import SeenCache
+import threading
+import random
+import time
+import re
+
+# requests (and http_client, which is built on it) takes about a tenth of
+# a second to import, so it is imported by the functions that go out on
+# the network; the main window can show its first frame without it
+
+API_URL = "https://api.aprs.fi/api/get"
+
+# aprs.fi accepts up to this many comma-separated call signs in dst
+MAX_DST_PER_CALL = 10
+
+# seconds to wait for the connection, and then between bytes of the answer
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 15
+
+# how many times a request is tried, and the backoff between tries: a
+# random wait of up to BACKOFF_BASE * 2**n seconds, capped at BACKOFF_CAP
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# HTTP statuses worth trying again; anything else is a final answer
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# how MsgTime (epoch seconds) is shown; it is stored as aprs.fi sends it
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+# the most rows a search returns, best matches first
+SEARCH_LIMIT = 500
+
+# only the newest this many matches of a search are ranked; bm25 over
+# every match of a common word costs most of a second at a million rows
+RANK_WINDOW = 2000
+
+# acked messages stay in APRSMessages this many days before they are
+# archived (the ArchiveAfterDays preference); purged ones go at once
+ARCHIVE_AFTER_DAYS = 30
+
+# messages moved to the archive per transaction
+ARCHIVE_BATCH = 500
+
+
+class APRSError(Exception):
+    """aprs.fi answered the request, but reported a failure"""
+
+
+def get_preference(db, key: str, default: str=None) -> str:
+    """Retrieve a value from the Preferences table
+
+    Parameters:
+    db (Database): the open database
+    key (str): the name of the preference
+    default (str): what to return if it has not been set (optional)
+
+    Returns:
+    (str): the stored value, or default
+    """
+
+    qry = "select value from Preferences where key = ?;"
+    rows = db.fetch_many(1, qry, [key])
+    if len(rows) == 1:
+        return rows[0]['value']
+    return default
+
+
+def set_preference(db, key: str, value: str):
+    """Store a value in the Preferences table
+
+    Parameters:
+    db (Database): the open database
+    key (str): the name of the preference
+    value (str): the value to store
+    """
+
+    qry = "insert or replace into Preferences (key, value) values (?, ?);"
+    db.execute_query(qry, [key, value])
+
+
+def get_api_key(db) -> str:
+    """Retrieve the APRS API key from the Preferences table
+
+    Parameters:
+    db (Database): the open database
+
+    Returns:
+    (str): the API key, or None if one has not been entered
+    """
+
+    return get_preference(db, 'APRSAPIKey')
+
+
+def get_watch_list(db) -> list:
+    """Retrieve the watched call signs from the Preferences table
+
+    Parameters:
+    db (Database): the open database
+
+    Returns:
+    (list): the call signs, possibly empty
+    """
+
+    return parse_callsigns(get_preference(db, 'WatchList', ''))
+
+
+def configure_limits(db):
+    """Set up the shared RateLimiter and CircuitBreaker from the preferences
+
+    Parameters:
+    db (Database): the open database
+    """
+
+    # every aprs.fi request, manual or scheduled, shares one budget
+    RateLimiter(capacity=float(get_preference(db, 'RateLimitBurst', 5)),
+                refill_rate=float(get_preference(db, 'RateLimitPerMinute', 6)) / 60,
+                reset=True)
+
+    # requests stop going out while aprs.fi keeps failing
+    CircuitBreaker(failure_threshold=int(get_preference(db, 'BreakerThreshold', 5)),
+                   reset_timeout=float(get_preference(db, 'BreakerResetSeconds', 60)),
+                   reset=True)
+
+
+def format_time(epoch: int) -> str:
+    """Show a MsgTime in local time
+
+    Parameters:
+    epoch (int): seconds since 1970-01-01 UTC, as stored
+
+    Returns:
+    (str): the time as TIME_FORMAT, or "" if there is none
+    """
+
+    if epoch is None or epoch == '':
+        return ""
+    return datetime.fromtimestamp(int(epoch)).strftime(TIME_FORMAT)
+
+
+def parse_callsigns(text: str) -> list:
+    """Split a comma or space separated list of call signs
+
+    The call signs are uppercased and duplicates dropped, keeping the
+    order they were entered in.
+
+    Parameters:
+    text (str): the call signs as typed by the user
+
+    Returns:
+    (list): the call signs
+    """
+
+    callsigns = []
+    for callsign in (text or "").replace(",", " ").split():
+        callsign = callsign.upper()
+        if callsign not in callsigns:
+            callsigns.append(callsign)
+    return callsigns
+
+
+def plan_batches(callsigns: list, batch_size: int=MAX_DST_PER_CALL) -> list:
+    """Pack call signs into as few API calls as the dst limit allows
+
+    Parameters:
+    callsigns (list): the call signs to fetch
+    batch_size (int): the most call signs aprs.fi accepts per call
+
+    Returns:
+    (list): a list of call sign lists, one per API call
+    """
+
+    callsigns = parse_callsigns(",".join(callsigns))
+    return [callsigns[i:i + batch_size] for i in range(0, len(callsigns), batch_size)]
+
+
+def _remaining(deadline: float) -> float:
+    """Seconds left before the deadline, or None if there is no deadline
+
+    Raises:
+    requests.exceptions.Timeout: the deadline has passed
+    """
+
+    import requests
+
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.exceptions.Timeout("The fetch ran out of time")
+    return remaining
+
+
+def _request(params: dict, dst: str, cancel: threading.Event, deadline: float) -> dict:
+    """Send one request to aprs.fi and decode the answer
+
+    The request waits its turn at the shared RateLimiter, then asks the
+    shared CircuitBreaker for leave to go out, and reports back to it.
+    The query parameters are URL-encoded by requests, so nothing typed
+    into them can add or cut off a parameter.
+
+    Returns:
+    (dict): the decoded JSON answer
+
+    Raises:
+    CircuitOpenError: the breaker refused the request
+    requests.exceptions.RequestException: the request failed; a
+        retryable failure is marked with a retry attribute
+    """
+
+    from http_client import HttpClient
+    import requests
+
+    try:
+        RateLimiter().acquire(dst, timeout=_remaining(deadline), cancel=cancel)
+    except TimeoutError:
+        raise requests.exceptions.Timeout("The fetch ran out of time waiting for a request slot")
+
+    # never wait past the deadline for a byte of the answer
+    read_timeout = READ_TIMEOUT
+    remaining = _remaining(deadline)
+    if remaining is not None:
+        read_timeout = min(read_timeout, remaining)
+
+    breaker = CircuitBreaker()
+    breaker.allow()
+    try:
+        response = HttpClient().get(API_URL, params=params, timeout=(CONNECT_TIMEOUT, read_timeout))
+        if response.status_code in RETRY_STATUSES:
+            response.raise_for_status()
+        json_output = response.json() if response.ok else None
+    except (requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.HTTPError,
+            ValueError) as e:
+        breaker.record_failure()
+        if not isinstance(e, requests.exceptions.RequestException):
+            e = requests.exceptions.InvalidJSONError(str(e))
+        e.retry = True
+        raise e
+    except Exception:
+        breaker.release()
+        raise
+
+    # any other status is aprs.fi answering; it is up, even if it said no
+    breaker.record_success()
+    response.raise_for_status()
+    return json_output
+
+
+def fetch_messages(callsigns: list, api_key: str, cancel: threading.Event=None, deadline: float=None) -> dict:
+    """Ask aprs.fi for the messages addressed to a batch of call signs
+
+    One request covers the whole batch; the entries are routed back to
+    the call sign they were addressed to. Connection failures, timeouts,
+    overload statuses and garbled answers are retried after a jittered
+    exponential backoff, up to MAX_ATTEMPTS tries.
+
+    Parameters:
+    callsigns (list): the destination call signs, at most MAX_DST_PER_CALL
+    api_key (str): the user's APRS API key
+    cancel (threading.Event): set it to give up as soon as possible (optional)
+    deadline (float): the time.monotonic() by which to give up (optional)
+
+    Returns:
+    (dict): call sign -> list of message entries returned by aprs.fi
+
+    Raises:
+    APRSError: aprs.fi reported a failure
+    CircuitOpenError: aprs.fi is failing and the request was not sent
+    CancelledError: cancel was set
+    requests.exceptions.RequestException: the request failed for good
+    """
+
+    import requests
+
+    dst = ",".join(callsigns)
+    params = {'what': 'msg', 'dst': dst, 'apikey': api_key, 'format': 'json'}
+    cancel = cancel or threading.Event()
+
+    attempt = 0
+    while True:
+        if cancel.is_set():
+            raise CancelledError(f"Fetch for {dst} cancelled")
+
+        try:
+            json_output = _request(params, dst, cancel, deadline)
+            break
+        except requests.exceptions.RequestException as e:
+            attempt += 1
+            if not getattr(e, 'retry', False) or attempt >= MAX_ATTEMPTS:
+                raise
+
+            # full jitter keeps batches that failed together from
+            # coming back together
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            if cancel.wait(delay):
+                raise CancelledError(f"Fetch for {dst} cancelled")
+
+    if json_output['result'] == 'fail':
+        raise APRSError(json_output['description'])
+
+    routed = {callsign: [] for callsign in callsigns}
+    for entry in json_output.get('entries', []):
+        routed.setdefault(entry.get('dst', '').upper(), []).append(entry)
+
+    return routed
+
+
+def _message_number(msg: dict) -> int:
+    """The aprs.fi messageid as a number, or None if it is not one
+
+    aprs.fi numbers messages as it receives them, so a larger messageid
+    is a newer message.
+    """
+
+    messageid = str(msg.get('messageid', ''))
+    return int(messageid) if messageid.isdigit() else None
+
+
+def get_high_water(db, callsign: str) -> int:
+    """Retrieve the newest messageid stored for a call sign
+
+    Parameters:
+    db (Database): the open database
+    callsign (str): the destination call sign
+
+    Returns:
+    (int): the messageid, or 0 if nothing has been stored for it
+    """
+
+    qry = "SELECT MsgID FROM HighWater WHERE Callsign = ?;"
+    rows = db.fetch_many(1, qry, [callsign])
+    return rows[0]['MsgID'] if rows else 0
+
+
+def newer_than(messages: list, high_water: int) -> list:
+    """Drop the entries at or below a call sign's high-water mark
+
+    An entry whose messageid is not a number cannot be placed, so it is
+    kept and left to the MsgID dedupe in store_messages.
+
+    Parameters:
+    messages (list): message entries as returned by aprs.fi
+    high_water (int): the newest messageid already stored
+
+    Returns:
+    (list): the entries that have not been seen yet
+    """
+
+    fresh = []
+    for msg in messages:
+        number = _message_number(msg)
+        if number is None or number > high_water:
+            fresh.append(msg)
+    return fresh
+
+
+def ingest(db, callsigns: list, api_key: str, cancel: threading.Event=None, deadline: float=None) -> dict:
+    """Fetch one batch of call signs and store what is new
+
+    Most of what aprs.fi returns was stored on an earlier fetch; only
+    the entries past each call sign's high-water mark reach the database.
+
+    Parameters:
+    db (Database): the open database
+    callsigns (list): the destination call signs, at most MAX_DST_PER_CALL
+    api_key (str): the user's APRS API key
+    cancel (threading.Event): set it to give up as soon as possible (optional)
+    deadline (float): the time.monotonic() by which to give up (optional)
+
+    Returns:
+    (dict): {'callsigns': list, 'retrieved': {call sign: int},
+        'new': {call sign: int}, 'midx': list of the new rows' MIdx}
+
+    Raises:
+    Whatever fetch_messages raises; CancelledError also if cancel is set
+    once the answer is in, in which case nothing is stored
+    """
+
+    routed = fetch_messages(callsigns, api_key, cancel, deadline)
+    if cancel is not None and cancel.is_set():
+        raise CancelledError(f"Fetch for {','.join(callsigns)} cancelled")
+
+    retrieved = {}
+    new = {}
+    new_midx = []
+    for callsign, messages in routed.items():
+        fresh = newer_than(messages, get_high_water(db, callsign))
+        stored = store_messages(db, fresh, callsign) if fresh else []
+        retrieved[callsign] = len(messages)
+        new[callsign] = len(stored)
+        new_midx.extend(stored)
+
+    return {'callsigns': callsigns,
+            'retrieved': retrieved,
+            'new': new,
+            'midx': new_midx}
+
+
+def store_messages(db, messages: list, callsign: str=None) -> list:
+    """Insert the messages that are not already in the database
+
+    Messages the SeenCache knows are stored are dropped first. The
+    unique index on MsgID does the rest of the dedupe, so the batch is
+    INSERT ... ON CONFLICT DO NOTHING in a single transaction. A MsgID
+    the cache cannot rule out is also checked against the archive by
+    the INSERT; one its Bloom filter rules out is in neither table, so
+    it skips that check. If a call sign is given, its high-water mark
+    moves up in the same transaction.
+
+    Parameters:
+    db (Database): the open database
+    messages (list): message entries as returned by aprs.fi
+    callsign (str): the call sign the messages were fetched for (optional)
+
+    Returns:
+    (list): the MIdx of each new message inserted
+    """
+
+    if not messages:
+        return []
+
+    # IDs the cache knows are stored need no SQL at all; IDs it knows
+    # are new skip the archive check; the unique index has the final say
+    cache = SeenCache()
+    seen, new, _ = cache.partition([str(msg['messageid']) for msg in messages])
+    seen, new = set(seen), set(new)
+
+    # Prepare data for insertion
+    new_rows, unknown_rows = [], []
+    for msg in messages:
+        msg_id = str(msg['messageid'])
+        if msg_id in seen:
+            continue
+        row = (msg_id, int(msg['time']), msg['srccall'], msg.get('dst'), msg['message'], 0)
+        (new_rows if msg_id in new else unknown_rows).append(row)
+    rows = new_rows + unknown_rows
+
+    new_qry = """
+        INSERT INTO APRSMessages (MsgID, MsgTime, MsgSource, MsgDest, MsgMessage, Acked, Purge)
+        VALUES (?1, ?2, ?3, ?4, ?5, ?6, 0)
+        ON CONFLICT (MsgID) DO NOTHING;
+    """
+    unknown_qry = """
+        INSERT INTO APRSMessages (MsgID, MsgTime, MsgSource, MsgDest, MsgMessage, Acked, Purge)
+        SELECT ?1, ?2, ?3, ?4, ?5, ?6, 0
+        WHERE NOT EXISTS (SELECT 1 FROM archive.APRSArchive WHERE MsgID = ?1)
+        ON CONFLICT (MsgID) DO NOTHING;
+    """
+
+    # MIdx only ever grows, so whatever is past the old maximum is new;
+    # the transaction keeps any other insert from landing in between
+    new_midx = []
+    with db.transaction():
+        if rows:
+            qry = "SELECT coalesce(max(MIdx), 0) AS MIdx FROM APRSMessages;"
+            last_midx = db.fetch_all(qry)[0]['MIdx']
+            inserted = 0
+            if new_rows:
+                inserted += db.execute_many(new_qry, new_rows)
+            if unknown_rows:
+                inserted += db.execute_many(unknown_qry, unknown_rows)
+            if inserted:
+                qry = "SELECT MIdx FROM APRSMessages WHERE MIdx > ? ORDER BY MIdx;"
+                new_midx = [row['MIdx'] for row in db.fetch_all(qry, [last_midx])]
+
+        numbered = [msg for msg in messages if _message_number(msg) is not None]
+        if callsign and numbered:
+            newest = max(numbered, key=_message_number)
+            qry = """
+                INSERT INTO HighWater (Callsign, MsgID, MsgTime) VALUES (?, ?, ?)
+                ON CONFLICT (Callsign) DO UPDATE SET MsgID = excluded.MsgID, MsgTime = excluded.MsgTime
+                WHERE excluded.MsgID > HighWater.MsgID;
+            """
+            db.execute_query(qry, [callsign, _message_number(newest), int(newest['time'])])
+
+    # committed: every ID sent to the INSERT is in the table now; once
+    # the filter fills, the caller warms it again (SeenCache.full)
+    cache.add([row[0] for row in rows])
+
+    return new_midx
+
+
+def flag_acked_for_purge(db) -> int:
+    """Flag every acknowledged message for deletion
+
+    Acked messages may have been moved to the archive already, so both
+    tables are flagged; purge_messages then deletes them from either.
+
+    Parameters:
+    db (Database): the open database
+
+    Returns:
+    (int): how many messages were newly flagged
+    """
+
+    flagged = 0
+    with db.transaction():
+        for table in ('APRSMessages', 'archive.APRSArchive'):
+            qry = f"UPDATE {table} SET Purge=1 WHERE Acked=1 AND Purge=0 RETURNING MIdx;"
+            flagged += len(db.fetch_all(qry, row_type='tuple'))
+    return flagged
+
+
+def purge_messages(db) -> int:
+    """Delete the messages flagged for deletion, for good
+
+    Flagged messages already moved to the archive are deleted there.
+    The SeenCache forgets them too.
+
+    Parameters:
+    db (Database): the open database
+
+    Returns:
+    (int): how many messages were deleted
+    """
+
+    with db.transaction():
+        msg_ids = []
+        for table in ('APRSMessages', 'archive.APRSArchive'):
+            qry = f"SELECT MsgID FROM {table} WHERE Purge=1;"
+            msg_ids.extend(row['MsgID'] for row in db.fetch_all(qry))
+            db.execute_query(f"DELETE FROM {table} WHERE Purge=1;")
+
+    SeenCache().discard(msg_ids)
+    return len(msg_ids)
+
+
+def fts_query(text: str) -> str:
+    """Turn what the user typed into an FTS5 MATCH expression
+
+    Every word must appear, in any column. Words are quoted, so FTS5
+    operators and punctuation in a call sign (N0CALL-9) are taken
+    literally, and "quoted phrases" stay phrases. A word ending in *
+    matches as a prefix (rel* finds relay); prefixes read every term
+    they cover, so they are only used when asked for.
+
+    Parameters:
+    text (str): the search box text
+
+    Returns:
+    (str): the MATCH expression, or '' if there is nothing to search for
+    """
+
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        term = (phrase or word).replace('"', '')
+        prefix = term.endswith('*')
+        term = term.rstrip('*').strip()
+        if term:
+            terms.append('"' + term + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def search_messages(db, text: str, include_acked: bool=False, limit: int=SEARCH_LIMIT, archive: bool=False,
+                    row_type: str='dict') -> list:
+    """Find messages by their text or call signs, best matches first
+
+    The search is served by the APRSMessages_fts index (APRSArchive_fts
+    for the archive); only the matching rows are read from the table.
+    The newest RANK_WINDOW
+    matches are found first, walking the index by rowid, and only
+    those are ranked, so a word found in half the table costs about
+    as much as a rare one.
+
+    Parameters:
+    db (Database): the open database
+    text (str): the words to look for, as typed
+    include_acked (bool): True to search acknowledged messages too (optional)
+    limit (int): the most rows to return (optional)
+    archive (bool): True to search the archive instead (optional)
+    row_type (str): how the rows are returned, as for Database.fetch_all (optional)
+
+    Returns:
+    (list): (MIdx, Acked, MsgID, MsgTime, MsgSource, MsgDest, MsgMessage)
+        for each match, ranked by bm25
+    """
+
+    match = fts_query(text)
+    if not match:
+        return []
+
+    table, fts = ('archive.APRSArchive', 'APRSArchive_fts') if archive else ('APRSMessages', 'APRSMessages_fts')
+    where = 'Purge=0' if include_acked else 'Acked=0 and Purge=0'
+    qry = f"""
+        SELECT m.MIdx, m.Acked, m.MsgID, m.MsgTime, m.MsgSource, m.MsgDest, m.MsgMessage
+        FROM {fts} f JOIN {table} m ON m.MIdx = f.rowid
+        WHERE {fts} MATCH :match AND {where}
+          AND f.rowid >= coalesce((
+              SELECT f.rowid FROM {fts} f JOIN {table} m ON m.MIdx = f.rowid
+              WHERE {fts} MATCH :match AND {where}
+              ORDER BY f.rowid DESC LIMIT 1 OFFSET :window), 0)
+        ORDER BY f.rank, m.MsgTime DESC
+        LIMIT :limit;
+    """
+    return db.fetch_all(qry, {'match': match, 'window': RANK_WINDOW - 1, 'limit': limit}, row_type=row_type)
+
+
+def archive_messages(db, older_than_days: float=ARCHIVE_AFTER_DAYS, batch: int=ARCHIVE_BATCH,
+                     cancel: threading.Event=None) -> list:
+    """Move acked and purged messages out of APRSMessages into the archive
+
+    Purged messages are moved at once, acked ones once they are older
+    than older_than_days. The archive is a separate file, and SQLite
+    does not commit a transaction across two WAL files as a whole, so
+    each batch is copied and committed first, and then the messages the
+    archive now holds are deleted in a second short transaction. A crash
+    can only leave a batch in both; the archive's MsgID index ignores
+    the copy when it is moved again. Fetches get the write lock between
+    the transactions.
+
+    A message whose MIdx the archive already uses for another message
+    (a database made anew next to an older archive) is archived under a
+    new MIdx.
+
+    Parameters:
+    db (Database): the open database
+    older_than_days (float): how old an acked message must be (optional)
+    batch (int): the most messages moved per transaction (optional)
+    cancel (threading.Event): set it to stop after the current batch (optional)
+
+    Returns:
+    (list): the MIdx of every message moved
+
+    Raises:
+    RuntimeError: a batch could not be moved at all
+    """
+
+    now = int(time.time())
+    cutoff = now - int(older_than_days * 86400)
+    select_qry = """
+        SELECT MIdx FROM APRSMessages
+        WHERE Purge=1 OR (Purge=0 AND Acked=1 AND MsgTime < ?)
+        LIMIT ?;
+    """
+
+    moved = []
+    while cancel is None or not cancel.is_set():
+        with db.transaction():
+            midxs = [row['MIdx'] for row in db.fetch_all(select_qry, [cutoff, batch])]
+            if not midxs:
+                break
+            marks = ','.join('?' * len(midxs))
+
+            # a message already archived (by MsgID) is not copied again; one
+            # whose MIdx is taken gets a new one past every MIdx in use
+            db.execute_query(f"""
+                INSERT INTO archive.APRSArchive (MIdx, MsgID, MsgTime, MsgSource, MsgMessage, Acked, Purge, MsgDest, ArchivedAt)
+                SELECT CASE WHEN taken.MIdx IS NULL THEN m.MIdx
+                            ELSE max((SELECT coalesce(max(MIdx), 0) FROM archive.APRSArchive),
+                                     (SELECT max(MIdx) FROM APRSMessages))
+                                 + count(taken.MIdx) OVER (ORDER BY m.MIdx) END,
+                       m.MsgID, m.MsgTime, m.MsgSource, m.MsgMessage, m.Acked, m.Purge, m.MsgDest, ?
+                FROM APRSMessages AS m
+                LEFT JOIN archive.APRSArchive AS taken ON taken.MIdx = m.MIdx
+                WHERE m.MIdx IN ({marks})
+                AND NOT EXISTS (SELECT 1 FROM archive.APRSArchive WHERE APRSArchive.MsgID = m.MsgID)
+                ORDER BY m.MIdx;""", [now] + midxs)
+
+        # the copies are committed; only what the archive holds is deleted
+        with db.transaction():
+            deleted = db.fetch_all(f"""
+                DELETE FROM APRSMessages WHERE MIdx IN ({marks})
+                AND EXISTS (SELECT 1 FROM archive.APRSArchive WHERE APRSArchive.MsgID = APRSMessages.MsgID)
+                RETURNING MIdx;""", midxs, row_type='tuple')
+        if not deleted:
+            # the same rows would only be picked again
+            raise RuntimeError(f"{len(midxs)} messages could not be moved to the archive")
+        moved.extend(midx for midx, in deleted)
+
+    return moved
@@ -0,0 +1,112 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# benchmarks/bench_database.py
+#
+# Measures Database throughput with SQLite's default settings and with
+# the Database.PRAGMAS profile, then the cost of reading the rows back
+# in each of fetch_all's row types and through iter_query.
+#
+#   python benchmarks/bench_database.py [rows]
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import Database
+
+
+def open_database(folder: str, name: str, pragmas: dict) -> Database:
+    """Create a fresh database in folder with the given PRAGMA profile"""
+
+    return Database(os.path.join(folder, name), opening=True, pragmas=pragmas)
+
+
+def message_rows(count: int, start: int=0) -> list:
+    """Rows shaped like the ones store_messages inserts"""
+
+    return [(str(start + i), 1741262400 + start + i, "N0CALL", "N7TMS", f"message {start + i}", 0)
+            for i in range(count)]
+
+
+def bench_batch_insert(db: Database, rows: int) -> float:
+    """Insert rows in fetch-sized batches of 100; returns rows/second"""
+
+    qry = """INSERT INTO APRSMessages (MsgID, MsgTime, MsgSource, MsgDest, MsgMessage, Acked, Purge)
+             VALUES (?, ?, ?, ?, ?, ?, 0) ON CONFLICT (MsgID) DO NOTHING;"""
+    start = time.perf_counter()
+    for first in range(0, rows, 100):
+        db.execute_many(qry, message_rows(min(100, rows - first), first))
+    return rows / (time.perf_counter() - start)
+
+
+def bench_ack(db: Database, rows: int) -> float:
+    """Acknowledge messages one click (one commit) at a time; returns acks/second"""
+
+    acks = min(rows, 1000)
+    qry = 'update APRSMessages set Acked=? where MIdx=?;'
+    start = time.perf_counter()
+    for midx in range(1, acks + 1):
+        db.execute_query(qry, [1, midx])
+    return acks / (time.perf_counter() - start)
+
+
+def bench_read(db: Database, row_type: str, stream: bool=False) -> tuple:
+    """Read every message, as fetch_all or iter_query would
+
+    The read is timed once as is and run again under tracemalloc, which
+    slows it down, for the memory it held.
+
+    Returns:
+    (tuple): rows/second, and the peak memory in MB the read held
+    """
+
+    qry = 'select MIdx, Acked, MsgID, MsgTime, MsgSource, MsgDest, MsgMessage from APRSMessages;'
+
+    def read() -> int:
+        if stream:
+            return sum(1 for _ in db.iter_query(qry, row_type=row_type))
+        return len(db.fetch_all(qry, row_type=row_type))
+
+    start = time.perf_counter()
+    rows = read()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    read()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows / seconds, peak / 1e6
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    with tempfile.TemporaryDirectory() as folder:
+        profiles = [('default', {}), ('tuned', Database.PRAGMAS)]
+        for name, pragmas in profiles:
+            db = open_database(folder, f"{name}.db", pragmas)
+            inserts = bench_batch_insert(db, rows)
+            acks = bench_ack(db, rows)
+            db.close()
+            print(f"{name:8} insert: {inserts:10.0f} rows/s   ack: {acks:8.0f} acks/s")
+
+        db = Database(os.path.join(folder, "tuned.db"), opening=True)
+        for row_type in Database.ROW_TYPES:
+            for stream in (False, True):
+                rate, peak = bench_read(db, row_type, stream)
+                name = f"{'iter_query' if stream else 'fetch_all'} {row_type}"
+                print(f"{name:18} read: {rate:10.0f} rows/s   peak: {peak:8.1f} MB")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
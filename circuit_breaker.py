@@ -0,0 +1,145 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# circuit_breaker.py
+#
+# Stops sending requests to aprs.fi while it keeps failing. After a
+# quiet spell a single trial request is let through; if it succeeds,
+# traffic resumes, otherwise the breaker stays open for another spell.
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    """The breaker is open, so the request was not sent"""
+
+
+class CircuitBreaker:
+    """The breaker shared by every aprs.fi request
+
+    Like Database, this class is a singleton. It counts failures in a
+    row; at failure_threshold it opens and refuses requests for
+    reset_timeout seconds. Then it goes half-open and lets exactly one
+    request through as a probe, which either closes the breaker or
+    opens it again.
+    """
+
+    _instance = None
+
+    def __new__(cls, failure_threshold: int=5, reset_timeout: float=60, reset: bool=False):
+        """Instantiate the shared breaker
+
+        If an instance does not already exist, create a new one. The
+        settings only take effect when the breaker is created (or reset).
+
+        Parameters:
+        failure_threshold (int): failures in a row that open the breaker
+        reset_timeout (float): seconds the breaker stays open before a probe
+        reset (bool): True to start over with a new, closed breaker
+
+        Returns:
+        _instance (CircuitBreaker): a reference to this instance of the object
+        """
+
+        if cls._instance is None or reset:
+            cls._instance = super(CircuitBreaker, cls).__new__(cls)
+            cls._instance.failure_threshold = failure_threshold
+            cls._instance.reset_timeout = reset_timeout
+            cls._instance.lock = threading.Lock()
+            cls._instance._state = CLOSED
+            cls._instance.failures = 0
+            cls._instance.opened = 0.0
+            cls._instance.probing = False
+
+        return cls._instance
+
+
+    def _update(self, now: float):
+        """Move from open to half-open once the quiet spell is over"""
+
+        if self._state == OPEN and now - self.opened >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self.probing = False
+
+
+    @property
+    def state(self) -> str:
+        """closed, open or half-open"""
+
+        with self.lock:
+            self._update(time.monotonic())
+            return self._state
+
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a probe through; 0 otherwise"""
+
+        with self.lock:
+            now = time.monotonic()
+            self._update(now)
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.opened + self.reset_timeout - now)
+
+
+    def allow(self):
+        """Check that a request may be sent
+
+        A half-open breaker lets one probe through and refuses the rest
+        until the probe is recorded.
+
+        Raises:
+        CircuitOpenError: the request must not be sent
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self._update(now)
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return
+
+            retry = max(0.0, self.opened + self.reset_timeout - now)
+            raise CircuitOpenError(f"aprs.fi is failing; not retrying for {retry:.0f} seconds")
+
+
+    def record_success(self):
+        """A request got a proper answer; close the breaker"""
+
+        with self.lock:
+            self._state = CLOSED
+            self.failures = 0
+            self.probing = False
+
+
+    def record_failure(self):
+        """A request failed; open the breaker if that is one too many"""
+
+        with self.lock:
+            self.failures += 1
+            if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._state = OPEN
+                self.opened = time.monotonic()
+                self.probing = False
+
+
+    def release(self):
+        """A request was let through but never finished (it was cancelled)
+
+        A half-open breaker lets the next request probe instead.
+        """
+
+        with self.lock:
+            self.probing = False
@@ -11,19 +11,230 @@
 #
 ##############################################################################
 
+from contextlib import contextmanager
+import threading
 import sqlite3
+import time
 import os
 
+
+class Message:
+    """One APRSMessages row, as Database.fetch_all(..., row_type='message')
+    returns it
+
+    The fields are slots rather than a dict, so a row costs a fraction
+    of the memory and is quicker to build; read them as attributes.
+    """
+
+    __slots__ = ('MIdx', 'Acked', 'MsgID', 'MsgTime', 'MsgSource', 'MsgDest', 'MsgMessage')
+
+    def __init__(self, MIdx: int=None, Acked: int=0, MsgID: str=None, MsgTime: int=None,
+                 MsgSource: str=None, MsgDest: str=None, MsgMessage: str=None):
+        self.MIdx = MIdx
+        self.Acked = Acked
+        self.MsgID = MsgID
+        self.MsgTime = MsgTime
+        self.MsgSource = MsgSource
+        self.MsgDest = MsgDest
+        self.MsgMessage = MsgMessage
+
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'Message({fields})'
+
+
+    @classmethod
+    def from_rows(cls, columns: list, rows: list) -> list:
+        """Build Messages from query rows
+
+        Parameters:
+        columns (list): the query's column names; every field must be
+            among them, in any order, and other columns are ignored
+        rows (list): the rows, as tuples
+
+        Returns:
+        (list): a Message for each row
+
+        Raises:
+        ValueError: if the query is missing a field
+        """
+
+        if columns == list(cls.__slots__):
+            return [cls(*row) for row in rows]
+
+        missing = [name for name in cls.__slots__ if name not in columns]
+        if missing:
+            raise ValueError(f"The query has no {', '.join(missing)} for a Message")
+        order = [columns.index(name) for name in cls.__slots__]
+        return [cls(*[row[i] for i in order]) for row in rows]
+
+
 class Database:
     """A general purpose class for managing SpurPoint SQLite databases
     
     This class uses a singleton object structure to ensure only one
     instance of the class is in use during the life of the application.
+
+    The instance is shared by the GUI thread and the background workers,
+    so each thread gets its own connection and cursor (conn and cursor
+    always return the calling thread's). In WAL mode the readers run
+    side by side; writes are serialized through write_lock. close()
+    closes every thread's connection at shutdown.
+
+    Every connection also attaches the archive, a second file next to
+    the database (briefpoint_archive.db for briefpoint.db) holding the
+    messages moved out of APRSMessages; its tables are archive.*.
     """
 
     _instance = None
 
-    def __new__(cls, db_name: str=os.path.join("briefpoint.db"), opening: bool=False):
+    # Each entry is the list of statements that takes the schema up one
+    # version. PRAGMA user_version records how many have been applied, so
+    # new and existing databases end up with the same schema.
+    MIGRATIONS = [
+        # 1: the destination call sign each message was fetched for
+        ['ALTER TABLE APRSMessages ADD COLUMN MsgDest TEXT;'],
+        # 2: MsgID is the dedupe key; keep the first copy of any duplicates
+        ['DELETE FROM APRSMessages WHERE MIdx NOT IN (SELECT min(MIdx) FROM APRSMessages GROUP BY MsgID);',
+         'CREATE UNIQUE INDEX idx_APRSMessages_MsgID ON APRSMessages (MsgID);'],
+        # 3: one covering index serves both message list queries, acked or
+        # not, in MsgTime order without touching the table or sorting
+        ['CREATE INDEX idx_APRSMessages_List ON APRSMessages (Purge, Acked, MsgTime, MsgID, MsgSource, MsgDest, MsgMessage);'],
+        # 4: the message list pages by (Acked, MsgTime, MIdx), which a NULL
+        # Acked would drop out of
+        ['UPDATE APRSMessages SET Acked=0 WHERE Acked IS NULL;'],
+        # 5: the newest aprs.fi messageid stored for each call sign, so a
+        # fetch can drop what it has already seen; seeded from the table
+        ['CREATE TABLE HighWater (Callsign TEXT PRIMARY KEY, MsgID INTEGER NOT NULL, MsgTime INTEGER);',
+         """INSERT INTO HighWater (Callsign, MsgID)
+            SELECT upper(MsgDest), max(CAST(MsgID AS INTEGER)) FROM APRSMessages
+            WHERE MsgDest IS NOT NULL AND MsgID NOT GLOB '*[^0-9]*' AND MsgID != ''
+            GROUP BY upper(MsgDest);"""],
+        # 6: MsgTime becomes the epoch seconds aprs.fi sends, formatted only
+        # for display. SQLite cannot change a column's type, so the table
+        # is rebuilt; the old "YYYY-MM-DD HH:MM" was local time. The
+        # AUTOINCREMENT counter is carried over so no MIdx is handed out twice.
+        ["""CREATE TABLE APRSMessages_new (
+                MIdx INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+                MsgID TEXT NOT NULL,
+                MsgTime INTEGER NOT NULL,
+                MsgSource TEXT,
+                MsgMessage TEXT,
+                Acked INTEGER DEFAULT 0,
+                Purge INTEGER DEFAULT 0,
+                MsgDest TEXT
+                );""",
+         """INSERT INTO APRSMessages_new (MIdx, MsgID, MsgTime, MsgSource, MsgMessage, Acked, Purge, MsgDest)
+            SELECT MIdx, MsgID, coalesce(CAST(strftime('%s', MsgTime, 'utc') AS INTEGER), 0),
+                   MsgSource, MsgMessage, Acked, Purge, MsgDest
+            FROM APRSMessages;""",
+         "DELETE FROM sqlite_sequence WHERE name = 'APRSMessages_new';",
+         """INSERT INTO sqlite_sequence (name, seq)
+            SELECT 'APRSMessages_new', seq FROM sqlite_sequence WHERE name = 'APRSMessages';""",
+         'DROP TABLE APRSMessages;',
+         'ALTER TABLE APRSMessages_new RENAME TO APRSMessages;',
+         'CREATE UNIQUE INDEX idx_APRSMessages_MsgID ON APRSMessages (MsgID);',
+         'CREATE INDEX idx_APRSMessages_List ON APRSMessages (Purge, Acked, MsgTime, MsgID, MsgSource, MsgDest, MsgMessage);',
+         # time-window queries over every message, acked or not
+         'CREATE INDEX idx_APRSMessages_MsgTime ON APRSMessages (MsgTime);'],
+        # 7: a full-text index of the message text and call signs. It is an
+        # external-content FTS5 table, so the text is not stored twice;
+        # the triggers keep it in step, and acks never touch it
+        ["""CREATE VIRTUAL TABLE APRSMessages_fts USING fts5(
+                MsgMessage, MsgSource, MsgDest,
+                content='APRSMessages', content_rowid='MIdx');""",
+         """CREATE TRIGGER APRSMessages_fts_insert AFTER INSERT ON APRSMessages BEGIN
+                INSERT INTO APRSMessages_fts (rowid, MsgMessage, MsgSource, MsgDest)
+                VALUES (new.MIdx, new.MsgMessage, new.MsgSource, new.MsgDest);
+            END;""",
+         """CREATE TRIGGER APRSMessages_fts_delete AFTER DELETE ON APRSMessages BEGIN
+                INSERT INTO APRSMessages_fts (APRSMessages_fts, rowid, MsgMessage, MsgSource, MsgDest)
+                VALUES ('delete', old.MIdx, old.MsgMessage, old.MsgSource, old.MsgDest);
+            END;""",
+         """CREATE TRIGGER APRSMessages_fts_update AFTER UPDATE OF MsgMessage, MsgSource, MsgDest ON APRSMessages BEGIN
+                INSERT INTO APRSMessages_fts (APRSMessages_fts, rowid, MsgMessage, MsgSource, MsgDest)
+                VALUES ('delete', old.MIdx, old.MsgMessage, old.MsgSource, old.MsgDest);
+                INSERT INTO APRSMessages_fts (rowid, MsgMessage, MsgSource, MsgDest)
+                VALUES (new.MIdx, new.MsgMessage, new.MsgSource, new.MsgDest);
+            END;""",
+         "INSERT INTO APRSMessages_fts (APRSMessages_fts) VALUES ('rebuild');"],
+        # 8: the per call sign retention quota counts and deletes by
+        # destination, oldest first
+        ['CREATE INDEX idx_APRSMessages_Dest ON APRSMessages (MsgDest, MsgTime);'],
+        # 9: the message list reads only its sort keys, then rows by MIdx,
+        # so the list index drops the text columns. MIdx (the rowid) now
+        # follows MsgTime in it, and keyset pages by (Acked, MsgTime, MIdx)
+        # or (MsgTime, MIdx) become a covering seek with no sort
+        ['DROP INDEX idx_APRSMessages_List;',
+         'CREATE INDEX idx_APRSMessages_List ON APRSMessages (Purge, Acked, MsgTime);'],
+    ]
+
+    # The same, for the attached archive; its own user_version counts them.
+    # APRSArchive keeps each message's MIdx, and the MsgID unique index
+    # lets a batch that was moved twice (after a crash) land only once.
+    ARCHIVE_MIGRATIONS = [
+        # 1: acked and purged messages moved out of APRSMessages, with a
+        # full-text index like the one on APRSMessages
+        ["""CREATE TABLE archive.APRSArchive (
+                MIdx INTEGER NOT NULL PRIMARY KEY,
+                MsgID TEXT NOT NULL,
+                MsgTime INTEGER NOT NULL,
+                MsgSource TEXT,
+                MsgMessage TEXT,
+                Acked INTEGER DEFAULT 0,
+                Purge INTEGER DEFAULT 0,
+                MsgDest TEXT,
+                ArchivedAt INTEGER NOT NULL
+                );""",
+         'CREATE UNIQUE INDEX archive.idx_APRSArchive_MsgID ON APRSArchive (MsgID);',
+         'CREATE INDEX archive.idx_APRSArchive_MsgTime ON APRSArchive (MsgTime);',
+         """CREATE VIRTUAL TABLE archive.APRSArchive_fts USING fts5(
+                MsgMessage, MsgSource, MsgDest,
+                content='APRSArchive', content_rowid='MIdx');""",
+         """CREATE TRIGGER archive.APRSArchive_fts_insert AFTER INSERT ON APRSArchive BEGIN
+                INSERT INTO APRSArchive_fts (rowid, MsgMessage, MsgSource, MsgDest)
+                VALUES (new.MIdx, new.MsgMessage, new.MsgSource, new.MsgDest);
+            END;""",
+         """CREATE TRIGGER archive.APRSArchive_fts_delete AFTER DELETE ON APRSArchive BEGIN
+                INSERT INTO APRSArchive_fts (APRSArchive_fts, rowid, MsgMessage, MsgSource, MsgDest)
+                VALUES ('delete', old.MIdx, old.MsgMessage, old.MsgSource, old.MsgDest);
+            END;"""],
+        # 2: as migration 8 of APRSMessages, for the retention quota
+        ['CREATE INDEX archive.idx_APRSArchive_Dest ON APRSArchive (MsgDest, MsgTime);'],
+    ]
+
+    # what fetch_all, fetch_many and iter_query can return rows as
+    ROW_TYPES = ('dict', 'tuple', 'row', 'message')
+
+    # rows iter_query reads at a time
+    ITER_CHUNK = 500
+
+    # the file settings the archive shares with the database, in order
+    ARCHIVE_PRAGMAS = ('auto_vacuum', 'journal_mode')
+
+    # SQLite does not commit a transaction across attached WAL files as a
+    # whole, so archive_messages commits each copy before deleting the
+    # originals. FULL syncs the archive's commits, so a power cut cannot
+    # take back a copy whose originals were already deleted.
+    ARCHIVE_SYNCHRONOUS = 'FULL'
+
+    # Applied to every connection as it is opened. WAL lets readers carry
+    # on while a fetch writes, and with WAL synchronous=NORMAL is still
+    # safe against corruption; a power cut can only lose the last commits.
+    # auto_vacuum only takes on a new file, and only before journal_mode;
+    # older files are converted by compact()
+    PRAGMAS = {
+        'auto_vacuum': 'INCREMENTAL',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -16000,       # negative means KiB, so 16 MB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,       # milliseconds
+    }
+
+    def __new__(cls, db_name: str=os.path.join("briefpoint.db"), opening: bool=False, pragmas: dict=None):
         """Instantiate a new instance of the database.
         
         If an instance does not already exist, create a new one.
@@ -34,6 +245,7 @@ class Database:
         Parameters:
         db_name (str): path of the database to be opened
         opening (bool): True if opening a different database
+        pragmas (dict): PRAGMA settings to use instead of PRAGMAS (optional)
 
         Returns:
         _instance (Database): a reference to this instance of the object
@@ -41,17 +253,27 @@ class Database:
 
         try:
                 if cls._instance is None or opening: 
+                        if cls._instance is not None:
+                                cls._instance.close()
+
                         cls._instance = super(Database, cls).__new__(cls)
                         cls._instance.dbName = db_name
+                        cls._instance.archiveName = cls.archive_name(db_name)
+                        cls._instance.write_lock = threading.RLock()
+                        cls._instance.pragmas = cls.PRAGMAS if pragmas is None else pragmas
+                        cls._instance._local = threading.local()
+                        cls._instance._connections = []
+                        cls._instance._connections_lock = threading.Lock()
+                        cls._instance._generation = 0   # bumped by close()
 
                         # if the db does not exist, create it; otherwise just open it.
                         if not os.path.exists(db_name):
-                                cls._instance.conn = sqlite3.connect(db_name)
-                                cls._instance.cursor = cls._instance.conn.cursor()
+                                cls._instance.connect()
                                 cls._instance.create_new_database()
                         else:
-                                cls._instance.conn = sqlite3.connect(db_name)
-                                cls._instance.cursor = cls._instance.conn.cursor()
+                                cls._instance.connect()
+
+                        cls._instance.migrate()
 
                 return cls._instance
             
@@ -59,7 +281,130 @@ class Database:
             return None
     
 
-    def execute_query(self, query: str, params: tuple=()) -> None:
+    @staticmethod
+    def archive_name(db_name: str) -> str:
+        """The archive file that goes with a database file
+
+        Parameters:
+        db_name (str): path of the database
+
+        Returns:
+        (str): the path with _archive added before the extension
+        """
+
+        root, ext = os.path.splitext(db_name)
+        return f"{root}_archive{ext or '.db'}"
+
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a connection for the calling thread and apply the PRAGMA profile
+
+        There is no need to call this directly; conn and cursor open the
+        connection the first time a thread uses the database.
+
+        Returns:
+        (sqlite3.Connection): the calling thread's new connection
+        """
+
+        # check_same_thread=False only so close() can close it from the GUI thread
+        conn = sqlite3.connect(self.dbName, check_same_thread=False)
+        cursor = conn.cursor()
+        for pragma, value in self.pragmas.items():
+            cursor.execute(f'PRAGMA {pragma} = {value};')
+
+        cursor.execute('ATTACH DATABASE ? AS archive;', [self.archiveName])
+        for pragma in self.ARCHIVE_PRAGMAS:
+            if pragma in self.pragmas:
+                cursor.execute(f'PRAGMA archive.{pragma} = {self.pragmas[pragma]};')
+        cursor.execute(f'PRAGMA archive.synchronous = {self.ARCHIVE_SYNCHRONOUS};')
+
+        self._local.conn = conn
+        self._local.cursor = cursor
+        self._local.depth = 0       # how many transaction() blocks are open
+        self._local.generation = self._generation
+        with self._connections_lock:
+            self._connections.append(conn)
+
+        return conn
+
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The calling thread's connection"""
+
+        if getattr(self._local, 'generation', None) != self._generation or self._local.conn is None:
+            self.connect()
+        return self._local.conn
+
+
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        """The calling thread's cursor"""
+
+        if getattr(self._local, 'generation', None) != self._generation or self._local.conn is None:
+            self.connect()
+        return self._local.cursor
+
+
+    @contextmanager
+    def transaction(self):
+        """Group several statements into a single commit
+
+        with db.transaction():
+            db.execute_many(insert_qry, rows)
+            db.execute_query(update_qry, params)
+
+        execute_query and execute_many do not commit inside the block;
+        everything is committed once at the end, or rolled back if the
+        block raises. A transaction inside another is a savepoint of the
+        outer one: if it raises, only its own statements are rolled back,
+        and the outer block carries on if it catches the exception.
+        The block holds write_lock, so writes from other threads wait
+        for it; their reads carry on against the last commit.
+        """
+
+        with self.write_lock:
+            conn = self.conn
+            cursor = self.cursor
+            depth = self._local.depth
+            savepoint = f'nested_{depth}'
+            if depth:
+                cursor.execute(f'SAVEPOINT {savepoint};')
+            elif not conn.in_transaction:
+                cursor.execute('BEGIN IMMEDIATE;')
+            self._local.depth += 1
+            try:
+                yield self
+            except:
+                self._local.depth -= 1
+                if depth:
+                    cursor.execute(f'ROLLBACK TO {savepoint};')
+                    cursor.execute(f'RELEASE {savepoint};')
+                else:
+                    conn.rollback()
+                raise
+            else:
+                self._local.depth -= 1
+                if depth:
+                    cursor.execute(f'RELEASE {savepoint};')
+                else:
+                    conn.commit()
+
+
+    def commit(self):
+        """Commit the statements run with commit=False
+
+        Does nothing inside a transaction() block, which commits at its end.
+        Changes left uncommitted hold SQLite's write lock, so a thread that
+        defers commits while others write should use transaction() instead.
+        """
+
+        conn = self.conn
+        if self._local.depth == 0:
+            conn.commit()
+
+
+    def execute_query(self, query: str, params: tuple=(), commit: bool=True) -> None:
         """Execute a non-returning SQL command
         
         This method is for commands such as UPDATE and INSERT that do
@@ -68,32 +413,77 @@ class Database:
         Parameters:
         query (str): the query to be executed
         params (tuple): tuple or list of parameters (optional)
+        commit (bool): False to leave the change for a later commit() (optional)
+        """
+
+        with self.write_lock:
+            self.cursor.execute(query, params)
+            if commit:
+                self.commit()
+
+
+    def _result(self, cursor: sqlite3.Cursor, rows: list, row_type: str) -> list:
+        """Shape fetched rows for fetch_all, fetch_many and iter_query
+
+        Only dict and message rows need the column names; tuple rows are
+        returned as fetched, and row rows were made by the cursor.
         """
 
-        self.cursor.execute(query, params)
-        self.conn.commit()
+        if row_type in ('tuple', 'row'):
+            return rows
+        columns = [desc[0] for desc in cursor.description]
+        if row_type == 'dict':
+            return [dict(zip(columns, row)) for row in rows]
+        return Message.from_rows(columns, rows)
+
+
+    def _query_cursor(self, row_type: str, cursor: sqlite3.Cursor=None) -> sqlite3.Cursor:
+        """The cursor to run a query on for the given row_type
+
+        Raises:
+        ValueError: if row_type is not one of ROW_TYPES
+        """
 
+        if row_type not in self.ROW_TYPES:
+            raise ValueError(f"row_type must be one of {', '.join(self.ROW_TYPES)}, not {row_type!r}")
 
-    def fetch_all(self, query: str, params: tuple=()) -> list:
+        # the thread's shared cursor stays plain; sqlite3.Row rows need
+        # a cursor of their own
+        if row_type == 'row':
+            cursor = self.conn.cursor()
+            cursor.row_factory = sqlite3.Row
+        return self.cursor if cursor is None else cursor
+
+
+    def fetch_all(self, query: str, params: tuple=(), row_type: str='dict') -> list:
         """Execute a SQL query
         
         This method is for retrieving rows from the database.
+
+        Rows are dicts keyed by column name unless row_type asks for
+        something cheaper: 'tuple' rows are returned just as SQLite
+        reads them, 'row' rows are sqlite3.Row (by index or by name),
+        and 'message' rows are Message records for APRSMessages queries.
         
         Parameters:
         query (str): the sql query to be executed
         params (tuple): tuple or list of parameters (optional)
-        """
+        row_type (str): 'dict', 'tuple', 'row' or 'message' (optional)
+
+        Returns:
+        (list): one row per result, of the row_type asked for
 
-        # construct a dictionary with column names as keys and execute
-        self.cursor.execute(query, params)
-        columns = [desc[0] for desc in self.cursor.description]  
-        results = self.cursor.fetchall()
+        Raises:
+        ValueError: for an unknown row_type, or a 'message' query
+            without the Message fields
+        """
 
-        # returns a list of dictionaries, one dict() for each row returned
-        return [dict(zip(columns, row)) for row in results]  
+        cursor = self._query_cursor(row_type)
+        cursor.execute(query, params)
+        return self._result(cursor, cursor.fetchall(), row_type)
 
 
-    def fetch_many(self, row_limit: int, query: str, params: tuple=()) -> list:
+    def fetch_many(self, row_limit: int, query: str, params: tuple=(), row_type: str='dict') -> list:
         """Execute a SQL query, returning only the number of rows specified
         
         This method returns upto the number of rows specified in the
@@ -105,18 +495,52 @@ class Database:
         row_limit (int): the number of rows to return
         query (str): the sql query to be executed
         params (tuple): tuple or list of parameters (optional)
+        row_type (str): 'dict', 'tuple', 'row' or 'message', as for
+            fetch_all (optional)
         """
 
-        # construct a dictionary with column names as keys and execute
-        self.cursor.execute(query, params)
-        columns = [desc[0] for desc in self.cursor.description]  
-        results = self.cursor.fetchmany(row_limit)
+        cursor = self._query_cursor(row_type)
+        cursor.execute(query, params)
+        return self._result(cursor, cursor.fetchmany(row_limit), row_type)
+
+
+    def iter_query(self, query: str, params: tuple=(), row_type: str='dict', chunk: int=ITER_CHUNK):
+        """Execute a SQL query, yielding its rows as they are read
+
+        Rows are fetched chunk at a time, so a large result is never
+        held in memory all at once. The query runs on a cursor of its
+        own, so other queries can be run while iterating. Writes from
+        other threads do not show up in a query already started, but
+        the calling thread should not change the rows it is reading
+        until the loop is done.
 
-        # returns a list of dictionaries, one dict() for each row returned
-        return [dict(zip(columns, row)) for row in results]  
+        for message in db.iter_query(qry, row_type='message'):
+            ...
 
+        Parameters:
+        query (str): the sql query to be executed
+        params (tuple): tuple or list of parameters (optional)
+        row_type (str): 'dict', 'tuple', 'row' or 'message', as for
+            fetch_all (optional)
+        chunk (int): how many rows to read at a time (optional)
+
+        Yields:
+        one row per result, of the row_type asked for
+        """
 
-    def execute_many(self, query: str, params: list=[]) -> None:
+        cursor = self._query_cursor(row_type, self.conn.cursor())
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk)
+                if not rows:
+                    break
+                yield from self._result(cursor, rows, row_type)
+        finally:
+            cursor.close()
+
+
+    def execute_many(self, query: str, params: list=[], commit: bool=True) -> int:
         """Executes SQL commands on a list a data
         
         This methods recieves a query string and a list of tuples for 
@@ -127,19 +551,227 @@ class Database:
         and params=[('Bob',5), ('John',10), ('Mary',12)], execute_many
         will insert three different records into the the runners table.
         
+        All of the rows are written in a single transaction.
+
         Parameters:
         query (str): the query string to be executed
         params (list): a list of tuples representing multiple sets of params
+        commit (bool): False to leave the change for a later commit() (optional)
+
+        Returns:
+        (int): the number of rows inserted, updated or deleted
         """
 
-        self.cursor.executemany(query, params)
-        self.conn.commit()
+        with self.write_lock:
+            cursor = self.cursor
+            cursor.executemany(query, params)
+            if commit:
+                self.commit()
+            return cursor.rowcount
 
     
+    def close_thread(self):
+        """Close the calling thread's connection, if it has one
+
+        The pool workers call this as their run ends. QThreadPool ends
+        idle threads and starts new ones, and without it each ended
+        thread's connection would stay open until close(). The next use
+        of the database on the thread opens a new connection.
+        """
+
+        conn = getattr(self._local, 'conn', None)
+        with self._connections_lock:
+            # after close() the connection is already closed and forgotten
+            if conn is not None and self._local.generation == self._generation:
+                self._connections.remove(conn)
+                conn.close()
+        self._local.conn = None
+
+
     def close(self):
-        """Close the database connection"""
+        """Close every thread's database connection
+
+        Part of the application's shutdown; wait for the workers to finish
+        first, since anything they have not committed is rolled back.
+        """
+
+        with self.write_lock, self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            # every thread opens a fresh connection if it is used again
+            self._generation += 1
+
+
+    def space_stats(self) -> dict:
+        """How much of each file is in use, for the database and the archive
+
+        Fragmentation is the share of pages that do not follow the page
+        before them in their table or index; it reads every page's
+        header, so it takes a moment on a large file, and belongs on a
+        worker thread. It needs the dbstat table, which not every SQLite
+        build has; without it, fragmentation_percent is None.
+
+        Returns:
+        (dict): schema ('main' or 'archive') -> {'file', 'auto_vacuum'
+            ('none', 'full' or 'incremental'), 'page_size', 'pages',
+            'free_pages', 'bytes', 'free_bytes', 'free_percent',
+            'fragmentation_percent'}
+        """
+
+        modes = {0: 'none', 1: 'full', 2: 'incremental'}
+        stats = {}
+        for schema, file in (('main', self.dbName), ('archive', self.archiveName)):
+            page_size = self.fetch_all(f'PRAGMA {schema}.page_size;')[0]['page_size']
+            pages = self.fetch_all(f'PRAGMA {schema}.page_count;')[0]['page_count']
+            free = self.fetch_all(f'PRAGMA {schema}.freelist_count;')[0]['freelist_count']
+            mode = self.fetch_all(f'PRAGMA {schema}.auto_vacuum;')[0]['auto_vacuum']
+
+            qry = """SELECT count(*) AS Pages, coalesce(sum(pageno != prev + 1), 0) AS OutOfPlace
+                     FROM (SELECT pageno, lag(pageno) OVER (PARTITION BY name ORDER BY path) AS prev
+                           FROM dbstat WHERE schema = ?)
+                     WHERE prev IS NOT NULL;"""
+            try:
+                scattered = self.fetch_all(qry, [schema])[0]
+            except sqlite3.OperationalError:
+                # built without SQLITE_ENABLE_DBSTAT_VTAB
+                scattered = None
+
+            if scattered is None:
+                fragmentation = None
+            elif scattered['Pages']:
+                fragmentation = 100.0 * scattered['OutOfPlace'] / scattered['Pages']
+            else:
+                fragmentation = 0.0
+
+            stats[schema] = {'file': file,
+                             'auto_vacuum': modes.get(mode, str(mode)),
+                             'page_size': page_size,
+                             'pages': pages,
+                             'free_pages': free,
+                             'bytes': pages * page_size,
+                             'free_bytes': free * page_size,
+                             'free_percent': 100.0 * free / pages if pages else 0.0,
+                             'fragmentation_percent': fragmentation}
+        return stats
+
 
-        self.conn.close()
+    def enable_incremental_vacuum(self, schema: str='main'):
+        """VACUUM a file, switching it to auto_vacuum INCREMENTAL
+
+        A file made before auto_vacuum was set needs this once. VACUUM
+        rewrites the whole file and cannot run inside a transaction, so
+        it is not one of the MIGRATIONS. Writes from other threads wait
+        for it, however long it takes, so it only runs when the user asks
+        for it (compact(full=True)).
+
+        Parameters:
+        schema (str): 'main' or 'archive' (optional)
+        """
+
+        with self.write_lock:
+            self.conn.commit()
+            self.cursor.execute(f'PRAGMA {schema}.auto_vacuum = INCREMENTAL;')
+            self.cursor.execute(f'VACUUM {schema};')
+
+
+    def incremental_vacuum(self, schema: str='main', pages: int=256) -> int:
+        """Return up to pages free pages to the file system
+
+        Each call is its own short transaction; call it outside of
+        transaction(). Does nothing unless auto_vacuum is INCREMENTAL.
+
+        Parameters:
+        schema (str): 'main' or 'archive' (optional)
+        pages (int): the most pages to release (optional)
+
+        Returns:
+        (int): how many pages were released
+        """
+
+        with self.write_lock:
+            before = self.fetch_all(f'PRAGMA {schema}.freelist_count;')[0]['freelist_count']
+            # execute() would only run the first step of the pragma
+            self.conn.executescript(f'PRAGMA {schema}.incremental_vacuum({int(pages)});')
+            after = self.fetch_all(f'PRAGMA {schema}.freelist_count;')[0]['freelist_count']
+        return before - after
+
+
+    def optimize(self):
+        """Refresh the query planner's statistics where they are stale
+
+        A file that has never been analyzed gets a full ANALYZE first.
+        """
+
+        with self.write_lock:
+            for schema in ('main', 'archive'):
+                qry = f"SELECT count(*) AS Found FROM {schema}.sqlite_master WHERE name = 'sqlite_stat1';"
+                if not self.fetch_all(qry)[0]['Found']:
+                    self.cursor.execute(f'ANALYZE {schema};')
+            self.cursor.execute('PRAGMA optimize;')
+            self.commit()
+
+
+    def compact(self, step_pages: int=256, pause: float=0.01, cancel: threading.Event=None,
+                full: bool=False) -> dict:
+        """Give the free pages of the database and the archive back, and
+        refresh the planner's statistics
+
+        Free pages are released step_pages at a time, each step a
+        transaction of its own, so other writers get in between steps.
+        A file that predates auto_vacuum=INCREMENTAL cannot release pages
+        that way; it is left alone and reported as needing a VACUUM.
+        full=True VACUUMs both files instead, converting them and undoing
+        fragmentation, with every other writer waiting until it is done.
+        The WAL is checkpointed at the end so the files actually shrink.
+
+        Parameters:
+        step_pages (int): the most pages released per step (optional)
+        pause (float): seconds between steps (optional)
+        cancel (threading.Event): set it to stop after the current step (optional)
+        full (bool): True to VACUUM both files (optional)
+
+        Returns:
+        (dict): schema -> {'vacuumed': bool, 'needs_vacuum': bool,
+            'released_pages': int, 'released_bytes': int}, and 'seconds'
+            for the whole run
+        """
+
+        start = time.monotonic()
+        result = {}
+        for schema in ('main', 'archive'):
+            outcome = {'vacuumed': False, 'needs_vacuum': False, 'released_pages': 0, 'released_bytes': 0}
+            result[schema] = outcome
+            if cancel is not None and cancel.is_set():
+                continue
+
+            page_size = self.fetch_all(f'PRAGMA {schema}.page_size;')[0]['page_size']
+            before = self.fetch_all(f'PRAGMA {schema}.page_count;')[0]['page_count']
+
+            if full:
+                self.enable_incremental_vacuum(schema)
+                outcome['vacuumed'] = True
+            elif self.fetch_all(f'PRAGMA {schema}.auto_vacuum;')[0]['auto_vacuum'] != 2:
+                outcome['needs_vacuum'] = True
+            else:
+                while cancel is None or not cancel.is_set():
+                    if not self.incremental_vacuum(schema, step_pages):
+                        break
+                    time.sleep(pause)
+
+            with self.write_lock:
+                self.cursor.execute(f'PRAGMA {schema}.wal_checkpoint(PASSIVE);')
+                self.cursor.fetchall()
+            after = self.fetch_all(f'PRAGMA {schema}.page_count;')[0]['page_count']
+            # a VACUUM can add pointer-map pages, so it can come out negative
+            outcome['released_pages'] = max(0, before - after)
+            outcome['released_bytes'] = outcome['released_pages'] * page_size
+
+        if cancel is None or not cancel.is_set():
+            self.optimize()
+
+        result['seconds'] = time.monotonic() - start
+        return result
 
 
     def create_new_database(self):
@@ -153,13 +785,13 @@ class Database:
         if os.path.exists(self.dbName): 
             # if a file exists, we have to close it before we delete to 
             # avoid a "File in use" error.
-            self.conn.close()
+            self.close()
             os.remove(self.dbName)
 
-            self.conn = sqlite3.connect(self.dbName)
-            self.cursor = self.conn.cursor()
+            self.connect()
 
-        # create all the tables
+        # create all the tables as they were in version 0 of the schema;
+        # migrate() applies everything that has changed since
         qry = '''CREATE TABLE Preferences (key TEXT PRIMARY KEY, value TEXT);'''
         self.execute_query(qry)
 
@@ -176,4 +808,35 @@ class Database:
         self.execute_query(qry)
 
 
-        
+    def migrate(self):
+        """Bring the schema up to the latest version
+
+        Each pending migration runs in its own transaction, together with
+        the bump of user_version, so an interrupted upgrade can be resumed.
+        The archive is brought up to date the same way.
+
+        A database made anew next to an older archive would number its
+        messages from 1 again, so the MIdx counter is moved past the
+        archive's highest MIdx.
+        """
+
+        with self.write_lock:
+            for schema, migrations in (('main', self.MIGRATIONS), ('archive', self.ARCHIVE_MIGRATIONS)):
+                self.cursor.execute(f'PRAGMA {schema}.user_version;')
+                version = self.cursor.fetchone()[0]
+
+                for number, statements in enumerate(migrations[version:], start=version + 1):
+                    with self.transaction():
+                        for statement in statements:
+                            self.cursor.execute(statement)
+                        self.cursor.execute(f'PRAGMA {schema}.user_version = {number};')
+
+            with self.transaction():
+                self.cursor.execute("""
+                    UPDATE sqlite_sequence SET seq = (SELECT max(MIdx) FROM archive.APRSArchive)
+                    WHERE name = 'APRSMessages' AND seq < (SELECT coalesce(max(MIdx), 0) FROM archive.APRSArchive);""")
+                self.cursor.execute("""
+                    INSERT INTO sqlite_sequence (name, seq)
+                    SELECT 'APRSMessages', max(MIdx) FROM archive.APRSArchive
+                    WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'APRSMessages')
+                    HAVING max(MIdx) IS NOT NULL;""")
@@ -0,0 +1,198 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# fetch_worker.py
+#
+# Runs the aprs.fi fetch, the internet check and other slow chores on
+# QThreadPool threads so the main window stays responsive.
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+from aprs_api import APRSError, ingest
+from circuit_breaker import CircuitOpenError
+from concurrent.futures import CancelledError
+from seen_cache import SeenCache
+import threading
+import time
+
+
+class FetchSignals(QObject):
+    """Signals a FetchWorker uses to report back to the GUI thread
+
+    QRunnable is not a QObject, so the signals live on this companion.
+
+    finished(dict): {'callsigns': list, 'retrieved': {call sign: int},
+        'new': {call sign: int}, 'midx': list of the new rows' MIdx}
+    failed(list, str, str): call signs, kind of failure ('api', 'network',
+        'circuit', 'cancelled' or 'error') and the error text
+    """
+
+    finished = Signal(dict)
+    failed = Signal(list, str, str)
+
+
+class FetchWorker(QRunnable):
+    """Fetch, dedupe and store the messages for one batch of call signs"""
+
+    def __init__(self, db, callsigns: list, api_key: str, time_limit: float=None):
+        """Prepare a fetch
+
+        Parameters:
+        db (Database): the open database
+        callsigns (list): the destination call signs, one API call's worth
+        api_key (str): the user's APRS API key
+        time_limit (float): the most seconds the fetch may take, retries
+            included; None for no limit (optional)
+        """
+
+        super().__init__()
+        self.db = db
+        self.callsigns = callsigns
+        self.api_key = api_key
+        self.time_limit = time_limit
+        self.cancelled = threading.Event()
+        self.signals = FetchSignals()
+
+
+    def cancel(self):
+        """Ask the fetch to stop; safe to call from any thread
+
+        A request already on the wire is not interrupted, but its answer
+        is thrown away and nothing is stored.
+        """
+
+        self.cancelled.set()
+
+
+    def run(self):
+        """Executed on a pool thread; never touch widgets from here"""
+
+        # imported here, on the pool thread, to keep it off the startup path
+        import requests
+
+        deadline = None if self.time_limit is None else time.monotonic() + self.time_limit
+
+        try:
+            result = ingest(self.db, self.callsigns, self.api_key, self.cancelled, deadline)
+
+        except CancelledError:
+            self.signals.failed.emit(self.callsigns, 'cancelled', "Fetch cancelled")
+        except CircuitOpenError as e:
+            self.signals.failed.emit(self.callsigns, 'circuit', str(e))
+        except APRSError as e:
+            self.signals.failed.emit(self.callsigns, 'api', str(e))
+        except requests.exceptions.RequestException as e:
+            self.signals.failed.emit(self.callsigns, 'network', str(e))
+        except Exception as e:
+            self.signals.failed.emit(self.callsigns, 'error', str(e))
+
+        else:
+            self.signals.finished.emit(result)
+
+        finally:
+            self.db.close_thread()
+
+
+class ProbeSignals(QObject):
+    """Signals a ProbeWorker uses to report back to the GUI thread
+
+    checked(bool): True if the internet is reachable
+    """
+
+    checked = Signal(bool)
+
+
+class ProbeWorker(QRunnable):
+    """Check for an internet connection without blocking the GUI"""
+
+    def __init__(self):
+        super().__init__()
+        self.signals = ProbeSignals()
+
+
+    def run(self):
+        """Executed on a pool thread; never touch widgets from here"""
+
+        from http_client import is_reachable
+
+        self.signals.checked.emit(is_reachable())
+
+
+class CacheWorker(QRunnable):
+    """Load the SeenCache from the database without blocking the GUI"""
+
+    def __init__(self, db):
+        """Prepare the load
+
+        Parameters:
+        db (Database): the open database
+        """
+
+        super().__init__()
+        self.db = db
+
+
+    def run(self):
+        """Executed on a pool thread; never touch widgets from here"""
+
+        try:
+            SeenCache().warm(self.db)
+        finally:
+            self.db.close_thread()
+
+
+class TaskSignals(QObject):
+    """Signals a TaskWorker uses to report back to the GUI thread
+
+    finished(object): whatever the task returned
+    failed(str): the error text
+    """
+
+    finished = Signal(object)
+    failed = Signal(str)
+
+
+class TaskWorker(QRunnable):
+    """Run one database chore (archiving, retention, compaction...) on
+    a pool thread, and report its result or its error"""
+
+    def __init__(self, db, task, cancel: threading.Event=None):
+        """Prepare the chore
+
+        Parameters:
+        db (Database): the open database
+        task (callable): the chore, called with no arguments; bind them
+            with functools.partial
+        cancel (threading.Event): the event the task watches to stop
+            early, if it has one (optional)
+        """
+
+        super().__init__()
+        self.db = db
+        self.task = task
+        self.cancelled = cancel
+        self.signals = TaskSignals()
+
+
+    def cancel(self):
+        """Ask the task to stop at its next check; safe to call from any thread"""
+
+        if self.cancelled is not None:
+            self.cancelled.set()
+
+
+    def run(self):
+        """Executed on a pool thread; never touch widgets from here"""
+
+        try:
+            result = self.task()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+        finally:
+            self.db.close_thread()
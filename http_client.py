@@ -0,0 +1,199 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# http_client.py
+#
+# One long-lived HTTP session shared by every network call in the
+# application, so connections to aprs.fi are pooled and kept alive
+# instead of paying DNS, TCP and TLS setup on each request.
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+from collections import deque
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import threading
+import requests
+import time
+
+
+# The connection classes below record their setup times here; the
+# request that caused the connection picks them up on the same thread.
+_setup_times = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """An HTTP connection that records how long it took to connect"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _setup_times.connect = time.perf_counter() - start
+        return sock
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """An HTTPS connection that records its TCP connect and TLS times"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _setup_times.connect = time.perf_counter() - start
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        # connect() covers the TCP connect as well as the TLS handshake
+        _setup_times.tls = time.perf_counter() - start - getattr(_setup_times, 'connect', 0.0)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """A pooling adapter whose connections report their setup times"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                   'https': _TimedHTTPSConnectionPool}
+
+
+class HttpClient:
+    """The shared HTTP session
+
+    Like Database, this class is a singleton: every caller gets the same
+    session and so the same connection pool. The session may be used
+    from several threads at once.
+    """
+
+    _instance = None
+
+    # how many requests' timings are kept for stats()
+    HISTORY = 100
+
+    def __new__(cls, pool_connections: int=4, pool_maxsize: int=8, reset: bool=False):
+        """Instantiate the shared session
+
+        If an instance does not already exist, create a new one. The pool
+        sizes only take effect when the session is created (or reset).
+
+        Parameters:
+        pool_connections (int): how many hosts to keep a pool for
+        pool_maxsize (int): how many connections to keep open per host
+        reset (bool): True to close the current session and build a new one
+
+        Returns:
+        _instance (HttpClient): a reference to this instance of the object
+        """
+
+        if cls._instance is None or reset:
+            if cls._instance is not None:
+                cls._instance.close()
+
+            cls._instance = super(HttpClient, cls).__new__(cls)
+            cls._instance.pool_connections = pool_connections
+            cls._instance.pool_maxsize = pool_maxsize
+
+            session = requests.Session()
+            adapter = _TimedAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'Accept-Encoding': 'gzip, deflate',
+                                    'Connection': 'keep-alive'})
+            cls._instance.session = session
+
+            cls._instance.lock = threading.Lock()
+            cls._instance.timings = deque(maxlen=cls.HISTORY)
+
+        return cls._instance
+
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request through the pooled session
+
+        Parameters:
+        url (str): the address to request
+        kwargs: anything requests.Session.get accepts (timeout, params...)
+
+        Returns:
+        (requests.Response): the response, with its body already read
+        """
+
+        _setup_times.connect = 0.0
+        _setup_times.tls = 0.0
+
+        start = time.perf_counter()
+        response = self.session.get(url, **kwargs)
+        total = time.perf_counter() - start
+
+        # leave the query string (and the API key in it) out of the stats
+        parts = urlsplit(url)
+        timing = {'url': f"{parts.scheme}://{parts.netloc}{parts.path}",
+                  'status': response.status_code,
+                  'connect': _setup_times.connect,
+                  'tls': _setup_times.tls,
+                  'first_byte': response.elapsed.total_seconds(),
+                  'total': total,
+                  'reused': _setup_times.connect == 0.0}
+        response.timing = timing
+        with self.lock:
+            self.timings.append(timing)
+
+        return response
+
+
+    def stats(self) -> dict:
+        """Summarize the timings of the recent requests
+
+        Returns:
+        (dict): request count, how many reused a pooled connection, the
+            average connect, tls, first_byte and total seconds, and the
+            timings of the last request
+        """
+
+        with self.lock:
+            timings = list(self.timings)
+
+        stats = {'requests': len(timings),
+                 'reused': sum(1 for timing in timings if timing['reused']),
+                 'last': timings[-1] if timings else None}
+        for key in ('connect', 'tls', 'first_byte', 'total'):
+            stats[key] = sum(timing[key] for timing in timings) / len(timings) if timings else 0.0
+
+        return stats
+
+
+    def close(self):
+        """Close the session and every pooled connection"""
+
+        self.session.close()
+
+
+def is_reachable(url: str="https://www.google.com", timeout: float=3) -> bool:
+    """Check for a working internet connection
+
+    Parameters:
+    url (str): an address that should always answer
+    timeout (float): seconds to wait for the answer
+
+    Returns:
+    (bool): True if the address answered with 200 OK
+    """
+
+    try:
+        response = HttpClient().get(url, timeout=timeout)
+        return response.status_code == 200
+    except requests.RequestException:
+        return False
@@ -0,0 +1,392 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# message_model.py
+#
+# A table model for the message list. Rows are read from the database
+# in chunks as the view scrolls, and only a bounded window of full rows
+# is kept in memory.
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, Signal
+from aprs_api import format_time, search_messages
+from collections import OrderedDict
+import bisect
+
+
+class MessageTableModel(QAbstractTableModel):
+    """The APRSMessages table, as shown in tblMessages
+
+    The model keeps the sort key of every row the view has scrolled to,
+    which is enough to page forward with a keyset query, and an LRU cache
+    of at most CACHE_ROWS full rows, filled a chunk at a time.
+
+    Because the keys are kept in display order, changes are applied as
+    row inserts and removals (insert_messages, remove_acked, an ACK
+    click, Show All) rather than by rebuilding the whole list.
+
+    While a search is set, the list is instead the search results in
+    rank order, read in one go from the full-text index. In archive
+    mode the search runs against the archive, and the rows are read-only.
+    """
+
+    COLUMNS = ['MIdx', 'ACKed', 'MsgID', 'MsgTime', 'MsgSource', 'MsgDest', 'Message']
+    ACK_COLUMN = 1
+    TIME_COLUMN = 3     # epoch seconds in the database, formatted for display
+
+    # rows read per fetchMore() and per cache fill
+    CHUNK = 200
+
+    # the most full rows kept in memory at once
+    CACHE_ROWS = 2000
+
+    # the user toggled an ACK checkbox: MIdx, MsgID, new Acked value
+    acked = Signal(int, str, int)
+
+    def __init__(self, db, parent=None):
+        """Build an empty model; the view asks for rows with fetchMore()
+
+        Parameters:
+        db (Database): the open database
+        parent (QObject): the Qt parent (optional)
+        """
+
+        super().__init__(parent)
+        self.db = db
+        self.showall = False
+        self.search = ''           # the search box text; '' lists everything
+        self.archive = False        # search the archive instead
+        self._keys = []             # sort key of each row; MIdx is last
+        self._exhausted = False     # every matching row has a key
+        self._cache = OrderedDict() # MIdx -> full row, least recent first
+
+
+    def set_show_all(self, showall: bool):
+        """Switch between unacknowledged messages and all messages
+
+        Show All lists the unacknowledged messages first, so switching
+        only adds or drops the acknowledged rows at the end of the list.
+
+        Parameters:
+        showall (bool): True to include acknowledged messages
+        """
+
+        if showall == self.showall:
+            return
+        self.showall = showall
+
+        if self.searching:
+            self.reload()
+            return
+
+        if showall:
+            # the acked rows sort after every row we have; page them in
+            self._keys = [(0,) + key for key in self._keys]
+            self._exhausted = False
+        else:
+            first_acked = bisect.bisect_left(self._keys, (1,))
+            if first_acked < len(self._keys):
+                # we reached the acked rows, so every unacked row is loaded
+                self._remove_rows(range(first_acked, len(self._keys)))
+                self._exhausted = True
+            self._keys = [key[1:] for key in self._keys]
+
+
+    @property
+    def searching(self) -> bool:
+        """True while the list is search results rather than every message"""
+
+        return bool(self.search) or self.archive
+
+
+    @property
+    def table(self) -> str:
+        """The table the rows come from"""
+
+        return 'archive.APRSArchive' if self.archive else 'APRSMessages'
+
+
+    def set_archive(self, archive: bool):
+        """Switch the search between APRSMessages and the archive
+
+        The archive is only ever searched, so with no search text the
+        archive list is empty.
+
+        Parameters:
+        archive (bool): True to search the archive
+        """
+
+        if archive == self.archive:
+            return
+        self.archive = archive
+        self.reload()
+
+
+    def set_search(self, text: str):
+        """List the messages matching a search, or everything again
+
+        Parameters:
+        text (str): the words to look for; '' to end the search
+        """
+
+        text = text.strip()
+        if text == self.search:
+            return
+        self.search = text
+        self.reload()
+
+
+    def reload(self):
+        """Forget every row and start over from the top
+
+        With a search set, the results are read here in full; each key
+        is the row's rank, so the keys stay in display order.
+        """
+
+        self.beginResetModel()
+        self._keys = []
+        self._exhausted = False
+        self._cache.clear()
+
+        if self.searching:
+            # everything in the archive was acked or purged; Show All is moot
+            found_rows = search_messages(self.db, self.search, self.showall or self.archive,
+                                         archive=self.archive, row_type='tuple') if self.search else []
+            for rank, found in enumerate(found_rows):
+                self._keys.append((rank, found[0]))
+                self._cache[found[0]] = found
+            self._exhausted = True
+
+        self.endResetModel()
+
+
+    def _key_query(self) -> tuple:
+        """The sort key columns, filter and order of the current list"""
+
+        if self.showall:
+            return 'Acked, MsgTime, MIdx', 'Purge=0'
+        return 'MsgTime, MIdx', 'Acked=0 and Purge=0'
+
+
+    def _next_keys_query(self) -> tuple:
+        """The query for the next chunk of sort keys, and its parameters
+
+        Paging is by key, not OFFSET, so each chunk is an index seek
+        no matter how far down the list the view is.
+        """
+
+        columns, where = self._key_query()
+        qry = f'select {columns} from APRSMessages where {where}'
+        order = f' order by {columns} limit ?;'
+
+        if self._keys:
+            marks = ', '.join('?' * len(self._keys[-1]))
+            return qry + f' and ({columns}) > ({marks})' + order, list(self._keys[-1]) + [self.CHUNK]
+        return qry + order, [self.CHUNK]
+
+
+    def _insert_key(self, key: tuple):
+        """Insert one row at its place in the sort order
+
+        A row that sorts after everything loaded so far is left for
+        fetchMore to pick up, unless the list is already complete. A row
+        fetchMore already picked up (it was committed before we heard
+        about it) is left alone.
+        """
+
+        row = bisect.bisect_left(self._keys, key)
+        if row < len(self._keys) and self._keys[row] == key:
+            return
+        if row == len(self._keys) and not self._exhausted:
+            return
+
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._keys.insert(row, key)
+        self.endInsertRows()
+
+
+    def _remove_rows(self, rows):
+        """Remove table rows, a contiguous run at a time"""
+
+        rows = sorted(rows, reverse=True)
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for key in self._keys[first:last + 1]:
+                self._cache.pop(key[-1], None)
+            del self._keys[first:last + 1]
+            self.endRemoveRows()
+
+
+    def insert_messages(self, midxs: list):
+        """Add newly stored messages to the list where they belong
+
+        Parameters:
+        midxs (list): the MIdx of each new message
+        """
+
+        if not midxs or self.searching:
+            return
+
+        columns, where = self._key_query()
+        marks = ','.join('?' * len(midxs))
+        qry = f'select {columns} from APRSMessages where {where} and MIdx in ({marks});'
+        for key in self.db.fetch_all(qry, list(midxs), row_type='tuple'):
+            self._insert_key(key)
+
+
+    def remove_acked(self):
+        """Drop the acknowledged rows, after they were flagged for purging"""
+
+        if self.searching:
+            self.reload()
+        elif self.showall:
+            first_acked = bisect.bisect_left(self._keys, (1,))
+            self._remove_rows(range(first_acked, len(self._keys)))
+
+
+    def remove_messages(self, midxs: list):
+        """Drop the rows of messages moved or deleted from APRSMessages
+
+        Parameters:
+        midxs (list): the MIdx of each message archived or deleted
+        """
+
+        if self.archive or not midxs:
+            return
+        gone = set(midxs)
+        self._remove_rows([row for row, key in enumerate(self._keys) if key[-1] in gone])
+
+
+    def canFetchMore(self, parent: QModelIndex=QModelIndex()) -> bool:
+        return not parent.isValid() and not self._exhausted
+
+
+    def fetchMore(self, parent: QModelIndex=QModelIndex()):
+        """Append the next chunk of rows"""
+
+        if parent.isValid():
+            return
+
+        qry, params = self._next_keys_query()
+        keys = self.db.fetch_all(qry, params, row_type='tuple')
+
+        if len(keys) < self.CHUNK:
+            self._exhausted = True
+        if not keys:
+            return
+
+        first = len(self._keys)
+        self.beginInsertRows(QModelIndex(), first, first + len(keys) - 1)
+        self._keys.extend(keys)
+        self.endInsertRows()
+
+
+    def _row(self, row: int) -> tuple:
+        """The full database row behind a table row
+
+        On a cache miss the whole chunk around the row is read at once,
+        and the least recently used rows are dropped to stay under
+        CACHE_ROWS.
+        """
+
+        midx = self._keys[row][-1]
+        if midx in self._cache:
+            self._cache.move_to_end(midx)
+            return self._cache[midx]
+
+        start = row - row % self.CHUNK
+        chunk = [key[-1] for key in self._keys[start:start + self.CHUNK]]
+        marks = ','.join('?' * len(chunk))
+        qry = f'select MIdx, Acked, MsgID, MsgTime, MsgSource, MsgDest, MsgMessage from {self.table} where MIdx in ({marks});'
+        for found in self.db.fetch_all(qry, chunk, row_type='tuple'):
+            self._cache[found[0]] = found
+        while len(self._cache) > self.CACHE_ROWS:
+            self._cache.popitem(last=False)
+
+        # a row deleted behind our back shows as blank until the next reload
+        return self._cache.get(midx, (midx,) + ('',) * (len(self.COLUMNS) - 1))
+
+
+    def rowCount(self, parent: QModelIndex=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._keys)
+
+
+    def columnCount(self, parent: QModelIndex=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+
+    def data(self, index: QModelIndex, role: int=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        column = index.column()
+
+        # the ACK column is a checkbox instead of the 0 or 1
+        if column == self.ACK_COLUMN:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if self._row(index.row())[column] else Qt.Unchecked
+            if role == Qt.TextAlignmentRole:
+                return Qt.AlignmentFlag.AlignCenter
+            return None
+
+        if role == Qt.DisplayRole:
+            value = self._row(index.row())[column]
+            if column == self.TIME_COLUMN:
+                return format_time(value)
+            return "" if value is None else str(value)
+        return None
+
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        flags = super().flags(index)
+        if index.column() == self.ACK_COLUMN and not self.archive:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+
+    def setData(self, index: QModelIndex, value, role: int=Qt.EditRole) -> bool:
+        """The user clicked an ACK checkbox; save it and tell the window
+
+        Without Show All an acknowledged row leaves the list; with it,
+        the row moves to its new place in the (Acked, MsgTime) order.
+        Search results keep their rank, so there the row stays put.
+        """
+
+        if index.column() != self.ACK_COLUMN or role != Qt.CheckStateRole or self.archive:
+            return False
+
+        status = 1 if Qt.CheckState(value) == Qt.Checked else 0
+        row = self._row(index.row())
+        midx, msg_id = row[0], row[2]
+
+        # change this message's acknowledgement in the database
+        qry = 'update APRSMessages set Acked=? where MIdx=?;'
+        self.db.execute_query(qry, [status, midx])
+
+        if self.search and self.showall:
+            self._cache[midx] = row[:1] + (status,) + row[2:]
+            self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        elif self.showall:
+            key = self._keys[index.row()]
+            self._remove_rows([index.row()])
+            self._cache[midx] = row[:1] + (status,) + row[2:]
+            self._insert_key((status,) + key[1:])
+        elif status:
+            self._remove_rows([index.row()])
+
+        self.acked.emit(midx, str(msg_id), status)
+        return True
@@ -0,0 +1,122 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# poller.py
+#
+# Decides when each watched call sign is polled next. A call sign that
+# keeps coming back empty is polled less and less often; one with new
+# traffic goes back to the fastest rate. Nothing in here touches Qt or
+# the network; the caller does the fetching.
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+import time
+
+
+class PollSchedule:
+    """The polling interval and next due time of each watched call sign"""
+
+    def __init__(self, floor: float=60, ceiling: float=900, backoff: float=2.0, idle_polls: int=3):
+        """Prepare an empty schedule
+
+        Parameters:
+        floor (float): the shortest interval between polls, in seconds
+        ceiling (float): the longest interval between polls, in seconds
+        backoff (float): what the interval is multiplied by when backing off
+        idle_polls (int): how many empty polls in a row before backing off
+        """
+
+        self.floor = floor
+        self.ceiling = max(floor, ceiling)
+        self.backoff = backoff
+        self.idle_polls = idle_polls
+
+        # call sign -> {'interval': s, 'next': time, 'quiet': n, 'polling': bool}
+        self.callsigns = {}
+
+
+    def set_callsigns(self, callsigns: list, now: float=None):
+        """Replace the watched call signs
+
+        Call signs already on the schedule keep their state; new ones are
+        due immediately.
+
+        Parameters:
+        callsigns (list): the call signs to poll
+        now (float): the current time.monotonic() (optional)
+        """
+
+        now = time.monotonic() if now is None else now
+        self.callsigns = {callsign: self.callsigns.get(callsign) or
+                                    {'interval': self.floor, 'next': now, 'quiet': 0, 'polling': False}
+                          for callsign in callsigns}
+
+
+    def due(self, now: float=None) -> list:
+        """Take the call signs that are due for a poll
+
+        The call signs returned are marked as being polled, and are not
+        returned again until record() reports the outcome.
+
+        Parameters:
+        now (float): the current time.monotonic() (optional)
+
+        Returns:
+        (list): the call signs to poll now
+        """
+
+        now = time.monotonic() if now is None else now
+        due = [callsign for callsign, state in self.callsigns.items()
+               if not state['polling'] and state['next'] <= now]
+        for callsign in due:
+            self.callsigns[callsign]['polling'] = True
+        return due
+
+
+    def record(self, callsign: str, new_count: int, now: float=None):
+        """Reschedule a call sign from the outcome of its poll
+
+        New messages put the call sign back to the floor interval. After
+        idle_polls empty polls in a row, each further empty poll (or a
+        failed one) stretches the interval, up to the ceiling. Call signs
+        that are not on the schedule are ignored, so manual fetches can
+        report here too.
+
+        Parameters:
+        callsign (str): the call sign that was polled
+        new_count (int): how many new messages the poll stored; 0 if it failed
+        now (float): the current time.monotonic() (optional)
+        """
+
+        state = self.callsigns.get(callsign)
+        if state is None:
+            return
+
+        now = time.monotonic() if now is None else now
+        if new_count:
+            state['interval'] = self.floor
+            state['quiet'] = 0
+        else:
+            state['quiet'] += 1
+            if state['quiet'] >= self.idle_polls:
+                state['interval'] = min(self.ceiling, state['interval'] * self.backoff)
+
+        state['next'] = now + state['interval']
+        state['polling'] = False
+
+
+    def seconds_until_due(self, now: float=None) -> float:
+        """How long until the next call sign is due, or None if none are waiting
+
+        Parameters:
+        now (float): the current time.monotonic() (optional)
+        """
+
+        now = time.monotonic() if now is None else now
+        waiting = [state['next'] for state in self.callsigns.values() if not state['polling']]
+        if not waiting:
+            return None
+        return max(0.0, min(waiting) - now)
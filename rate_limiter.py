@@ -0,0 +1,165 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# rate_limiter.py
+#
+# A token bucket that every aprs.fi request has to pass through, so that
+# manual fetches, scheduled polls and batches together stay within the
+# API usage guidelines.
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError
+import threading
+import time
+
+
+class RateLimiter:
+    """The token bucket shared by every aprs.fi request
+
+    Like Database, this class is a singleton. The bucket holds up to
+    capacity tokens and gains refill_rate tokens a second; each request
+    takes one, waiting if the bucket is empty.
+
+    Waiting requests are queued by key (the call signs being fetched)
+    and the keys take turns, so one busy call sign cannot starve the
+    others.
+    """
+
+    _instance = None
+
+    # how many waits are kept for stats()
+    HISTORY = 100
+
+    # how often a waiting request looks at its cancel event, in seconds
+    CANCEL_POLL = 0.25
+
+    def __new__(cls, capacity: float=5, refill_rate: float=0.1, reset: bool=False):
+        """Instantiate the shared bucket
+
+        If an instance does not already exist, create a new one. The
+        settings only take effect when the bucket is created (or reset).
+
+        Parameters:
+        capacity (float): the most tokens the bucket holds; the burst size
+        refill_rate (float): tokens added per second
+        reset (bool): True to start over with a new, full bucket
+
+        Returns:
+        _instance (RateLimiter): a reference to this instance of the object
+        """
+
+        if cls._instance is None or reset:
+            cls._instance = super(RateLimiter, cls).__new__(cls)
+            cls._instance.capacity = capacity
+            cls._instance.refill_rate = refill_rate
+            cls._instance.tokens = capacity
+            cls._instance.updated = time.monotonic()
+            cls._instance.condition = threading.Condition()
+            cls._instance.queues = OrderedDict()    # key -> deque of waiting tickets
+            cls._instance.waits = deque(maxlen=cls.HISTORY)
+
+        return cls._instance
+
+
+    def _refill(self, now: float):
+        """Add the tokens earned since the last refill"""
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+
+    def _leave(self, key: str, ticket: object, served: bool):
+        """Take a ticket out of its queue
+
+        A key that was just served goes to the back of the line.
+        """
+
+        queue = self.queues[key]
+        queue.remove(ticket)
+        if not queue:
+            del self.queues[key]
+        elif served:
+            self.queues.move_to_end(key)
+
+
+    def acquire(self, key: str, timeout: float=None, cancel: threading.Event=None) -> float:
+        """Wait for a token
+
+        Parameters:
+        key (str): who is asking, normally the call signs being fetched
+        timeout (float): the most seconds to wait; None waits for as long
+            as it takes (optional)
+        cancel (threading.Event): set it to give up waiting (optional)
+
+        Returns:
+        (float): how many seconds the request waited
+
+        Raises:
+        TimeoutError: no token came up within timeout seconds
+        CancelledError: cancel was set while waiting
+        """
+
+        ticket = object()
+        start = time.monotonic()
+
+        with self.condition:
+            self.queues.setdefault(key, deque()).append(ticket)
+
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                # the head of the first key's queue is next in line
+                first = next(iter(self.queues))
+                if self.queues[first][0] is ticket and self.tokens >= 1:
+                    self.tokens -= 1
+                    self._leave(key, ticket, served=True)
+                    self.condition.notify_all()
+
+                    waited = now - start
+                    self.waits.append(waited)
+                    return waited
+
+                if cancel is not None and cancel.is_set():
+                    self._leave(key, ticket, served=False)
+                    self.condition.notify_all()
+                    raise CancelledError(f"Request for {key} cancelled")
+
+                if timeout is not None and now - start >= timeout:
+                    self._leave(key, ticket, served=False)
+                    self.condition.notify_all()
+                    raise TimeoutError(f"No request slot for {key} within {timeout} seconds")
+
+                # sleep until the next token is due, or until someone leaves
+                delay = max(0.0, (1 - self.tokens) / self.refill_rate) if self.refill_rate else None
+                if timeout is not None:
+                    remaining = timeout - (now - start)
+                    delay = remaining if delay is None else min(delay, remaining)
+                if cancel is not None:
+                    delay = self.CANCEL_POLL if delay is None else min(delay, self.CANCEL_POLL)
+                self.condition.wait(delay)
+
+
+    def stats(self) -> dict:
+        """The current state of the bucket and the recent waits
+
+        Returns:
+        (dict): tokens available, queue_depth (requests waiting),
+            queued_keys, and the count, average and longest of the
+            recent waits in seconds
+        """
+
+        with self.condition:
+            self._refill(time.monotonic())
+            waits = list(self.waits)
+            return {'tokens': self.tokens,
+                    'queue_depth': sum(len(queue) for queue in self.queues.values()),
+                    'queued_keys': len(self.queues),
+                    'waits': len(waits),
+                    'avg_wait': sum(waits) / len(waits) if waits else 0.0,
+                    'max_wait': max(waits) if waits else 0.0}
@@ -0,0 +1,54 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# resources.py
+#
+# Registers the icons and logo under :/Main. The binary ui/icons.rcc is
+# memory-mapped by Qt, which is much cheaper than importing ui/icons_rc.py
+# (a few hundred KB of Python bytes literal); that module is only the
+# fallback when the .rcc is missing.
+#
+# Rebuild the .rcc whenever ui/icons.qrc changes:
+#   pyside6-rcc --binary --no-compress ui/icons.qrc -o ui/icons.rcc
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+from PySide6.QtCore import QResource
+import sys
+import os
+
+RCC_FILE = os.path.join("ui", "icons.rcc")
+
+_loaded = None
+
+
+def _base_dir() -> str:
+    """The folder the application's files are in, frozen or not"""
+
+    # a PyInstaller one-file build unpacks its data files to _MEIPASS
+    return getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_resources() -> str:
+    """Register the application's resources, once
+
+    Returns:
+    (str): 'rcc' if the binary file was mapped, 'python' if the
+        embedded fallback module was imported
+    """
+
+    global _loaded
+    if _loaded:
+        return _loaded
+
+    # uncompressed, the images are used straight out of the mapped file
+    if QResource.registerResource(os.path.join(_base_dir(), RCC_FILE)):
+        _loaded = 'rcc'
+    else:
+        import ui.icons_rc
+        _loaded = 'python'
+
+    return _loaded
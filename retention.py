@@ -0,0 +1,191 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# retention.py
+#
+# Caps how much message history is kept. A policy limits the age of the
+# messages, their total number and the number per call sign; whatever
+# is over a limit is deleted for good, oldest first, from APRSMessages
+# and the archive alike. Deletes run a small chunk per transaction so
+# fetches and the main window never wait long for the write lock.
+# Nothing in here touches Qt.
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+from aprs_api import get_preference, set_preference
+from seen_cache import SeenCache
+import threading
+import time
+
+# messages deleted per transaction
+RETENTION_CHUNK = 500
+
+# seconds between chunks, so a waiting writer gets the lock
+RETENTION_PAUSE = 0.01
+
+# the tables a policy applies to, oldest messages first; Hot tells them apart
+_TABLES = (('archive.APRSArchive', 0), ('APRSMessages', 1))
+
+
+class RetentionPolicy:
+    """The limits on kept messages; 0 means no limit"""
+
+    def __init__(self, max_age_days: float=0, max_messages: int=0, max_per_callsign: int=0):
+        """Set the limits
+
+        Parameters:
+        max_age_days (float): delete messages older than this many days
+        max_messages (int): keep at most this many messages in all
+        max_per_callsign (int): keep at most this many messages per
+            destination call sign
+        """
+
+        self.max_age_days = max_age_days
+        self.max_messages = max_messages
+        self.max_per_callsign = max_per_callsign
+
+
+    @classmethod
+    def from_preferences(cls, db):
+        """The policy saved in the database (RetainDays, RetainMessages,
+        RetainPerCallsign); no limits if none was saved
+
+        Parameters:
+        db (Database): the open database
+
+        Returns:
+        (RetentionPolicy): the saved policy
+        """
+
+        return cls(max_age_days=float(get_preference(db, 'RetainDays', 0)),
+                   max_messages=int(get_preference(db, 'RetainMessages', 0)),
+                   max_per_callsign=int(get_preference(db, 'RetainPerCallsign', 0)))
+
+
+    def save(self, db):
+        """Save the policy as the database's preferences
+
+        Parameters:
+        db (Database): the open database
+        """
+
+        with db.transaction():
+            set_preference(db, 'RetainDays', f'{self.max_age_days:g}')
+            set_preference(db, 'RetainMessages', str(self.max_messages))
+            set_preference(db, 'RetainPerCallsign', str(self.max_per_callsign))
+
+
+    @property
+    def enabled(self) -> bool:
+        """True if the policy sets any limit"""
+
+        return bool(self.max_age_days or self.max_messages or self.max_per_callsign)
+
+
+    def describe(self) -> str:
+        """The limits, for people"""
+
+        limits = []
+        if self.max_age_days:
+            limits.append(f"{self.max_age_days:g} days")
+        if self.max_messages:
+            limits.append(f"{self.max_messages} messages")
+        if self.max_per_callsign:
+            limits.append(f"{self.max_per_callsign} per call sign")
+        return ", ".join(limits) if limits else "keep everything"
+
+
+def _delete_oldest(db, where: str, params: list, limit: int, chunk: int,
+                   cancel: threading.Event, deleted_midx: list) -> int:
+    """Delete the oldest messages matching a filter, a chunk at a time
+
+    Parameters:
+    db (Database): the open database
+    where (str): the filter, applied to both tables
+    params (list): the filter's parameters
+    limit (int): the most messages to delete; None for all that match
+    chunk (int): the most messages deleted per transaction
+    cancel (threading.Event): set it to stop after the current chunk
+    deleted_midx (list): the MIdx of each APRSMessages row deleted is
+        appended to it
+
+    Returns:
+    (int): how many messages were deleted
+    """
+
+    select = ' UNION ALL '.join(f'SELECT {hot} AS Hot, MIdx, MsgID, MsgTime FROM {table} WHERE {where}'
+                                for table, hot in _TABLES)
+    deleted = 0
+    while limit is None or deleted < limit:
+        if cancel is not None and cancel.is_set():
+            break
+
+        take = chunk if limit is None else min(chunk, limit - deleted)
+        with db.transaction():
+            rows = db.fetch_all(f'{select} ORDER BY MsgTime, MIdx LIMIT ?;', params * len(_TABLES) + [take])
+            if not rows:
+                break
+            for table, hot in _TABLES:
+                midxs = [row['MIdx'] for row in rows if row['Hot'] == hot]
+                if midxs:
+                    marks = ','.join('?' * len(midxs))
+                    db.execute_query(f'DELETE FROM {table} WHERE MIdx IN ({marks});', midxs)
+                    if hot:
+                        deleted_midx.extend(midxs)
+
+        SeenCache().discard([row['MsgID'] for row in rows])
+        deleted += len(rows)
+        time.sleep(RETENTION_PAUSE)
+
+    return deleted
+
+
+def apply_retention(db, policy: RetentionPolicy, chunk: int=RETENTION_CHUNK,
+                    cancel: threading.Event=None) -> dict:
+    """Delete the messages a policy does not keep
+
+    The age limit goes first, then the per call sign quota, then the
+    overall count, each deleting the oldest messages first. The
+    full-text indexes follow through their triggers.
+
+    Parameters:
+    db (Database): the open database
+    policy (RetentionPolicy): the limits to apply
+    chunk (int): the most messages deleted per transaction (optional)
+    cancel (threading.Event): set it to stop after the current chunk (optional)
+
+    Returns:
+    (dict): {'age': int, 'quota': int, 'count': int} messages deleted
+        by each limit, 'midx': the MIdx of the APRSMessages rows deleted,
+        and 'seconds': how long the run took
+    """
+
+    start = time.monotonic()
+    result = {'age': 0, 'quota': 0, 'count': 0, 'midx': []}
+
+    if policy.max_age_days:
+        cutoff = int(time.time() - policy.max_age_days * 86400)
+        result['age'] = _delete_oldest(db, 'MsgTime < ?', [cutoff], None, chunk, cancel, result['midx'])
+
+    if policy.max_per_callsign:
+        counts = ' UNION ALL '.join(f'SELECT MsgDest FROM {table}' for table, _ in _TABLES)
+        qry = f"""SELECT MsgDest, count(*) AS Rows FROM ({counts})
+                  WHERE MsgDest IS NOT NULL
+                  GROUP BY MsgDest HAVING count(*) > ?;"""
+        for row in db.fetch_all(qry, [policy.max_per_callsign]):
+            result['quota'] += _delete_oldest(db, 'MsgDest = ?', [row['MsgDest']],
+                                              row['Rows'] - policy.max_per_callsign,
+                                              chunk, cancel, result['midx'])
+
+    if policy.max_messages:
+        counts = ' + '.join(f'(SELECT count(*) FROM {table})' for table, _ in _TABLES)
+        rows = db.fetch_all(f'SELECT {counts} AS Rows;')[0]['Rows']
+        if rows > policy.max_messages:
+            result['count'] = _delete_oldest(db, '1', [], rows - policy.max_messages,
+                                             chunk, cancel, result['midx'])
+
+    result['seconds'] = time.monotonic() - start
+    return result
@@ -0,0 +1,258 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# seen_cache.py
+#
+# An in-memory record of the MsgIDs already in the database, consulted
+# before store_messages goes to SQLite. The most recent IDs are kept
+# exactly in an LRU; every ID is in a Bloom filter, which can say for
+# certain that an ID has never been stored, in APRSMessages or the
+# archive, so store_messages can insert it without checking the archive.
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+from collections import OrderedDict
+import threading
+import hashlib
+import math
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter of strings
+
+    might_contain() is never wrong when it says False; when it says True
+    the string was probably added, with about error_rate odds of a false
+    alarm while no more than capacity strings have been added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float=0.01):
+        """Size the filter for capacity strings
+
+        Parameters:
+        capacity (int): how many strings the filter is sized for
+        error_rate (float): the false positive rate at capacity
+        """
+
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+
+    def _positions(self, item: str):
+        """The bit positions for item, by double hashing one digest"""
+
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+
+    def add(self, item: str):
+        """Add a string to the filter"""
+
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+
+    def might_contain(self, item: str) -> bool:
+        """False if item was certainly never added"""
+
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class SeenCache:
+    """The MsgIDs known to be in the database
+
+    Like Database, this class is a singleton, shared by every fetch.
+    Until warm() has run it knows nothing, and every ID is left to the
+    database to decide.
+
+    Deleting a message drops it from the LRU, but a Bloom filter cannot
+    forget; the deleted ID just costs a trip to the database, as any
+    false positive does.
+    """
+
+    _instance = None
+
+    # the Bloom filter is sized for the table at warm() times this; once
+    # it fills, the caller warms it again from the database off the
+    # fetch path (a CacheWorker, or between polls)
+    HEADROOM = 2
+
+    # the smallest table the Bloom filter is sized for
+    MIN_CAPACITY = 10000
+
+    def __new__(cls, lru_size: int=5000, error_rate: float=0.01, reset: bool=False):
+        """Instantiate the shared cache
+
+        If an instance does not already exist, create a new one. The
+        settings only take effect when the cache is created (or reset).
+
+        Parameters:
+        lru_size (int): how many recent MsgIDs are kept exactly
+        error_rate (float): the Bloom filter's false positive rate
+        reset (bool): True to start over with a new, empty cache
+
+        Returns:
+        _instance (SeenCache): a reference to this instance of the object
+        """
+
+        if cls._instance is None or reset:
+            cls._instance = super(SeenCache, cls).__new__(cls)
+            cls._instance.lru_size = lru_size
+            cls._instance.error_rate = error_rate
+            cls._instance.lock = threading.Lock()
+            cls._instance.recent = OrderedDict()    # MsgID -> None, oldest first
+            cls._instance.bloom = None
+            cls._instance.warming = False   # a warm() is running
+            cls._instance.hits = 0          # found in the LRU; no SQL needed
+            cls._instance.new = 0           # ruled out by the Bloom filter
+            cls._instance.misses = 0        # had to be left to the database
+
+        return cls._instance
+
+
+    def warm(self, db):
+        """Load the cache from the database
+
+        Every MsgID, archived ones included, goes into a Bloom filter
+        sized from the row count, and the newest lru_size of them into
+        the LRU. Safe to run on a
+        worker thread; lookups carry on against the old state meanwhile.
+
+        Parameters:
+        db (Database): the open database
+        """
+
+        with self.lock:
+            self.warming = True
+        try:
+            qry = "SELECT (SELECT count(*) FROM APRSMessages) + (SELECT count(*) FROM archive.APRSArchive) AS Rows;"
+            rows = db.fetch_all(qry)[0]['Rows']
+            bloom = BloomFilter(max(self.MIN_CAPACITY, rows * self.HEADROOM), self.error_rate)
+
+            # the archive holds the older messages, so it goes first
+            recent = OrderedDict()
+            for table in ('archive.APRSArchive', 'APRSMessages'):
+                qry = f"SELECT MsgID FROM {table} ORDER BY MIdx;"
+                for msg_id, in db.iter_query(qry, row_type='tuple'):
+                    bloom.add(msg_id)
+                    recent[msg_id] = None
+                    if len(recent) > self.lru_size:
+                        recent.popitem(last=False)
+
+            with self.lock:
+                self.bloom = bloom
+                self.recent = recent
+        finally:
+            with self.lock:
+                self.warming = False
+
+
+    @property
+    def full(self) -> bool:
+        """True once the Bloom filter holds more than it was sized for,
+        and no warm() is already under way to replace it"""
+
+        with self.lock:
+            return (not self.warming and self.bloom is not None
+                    and self.bloom.count > self.bloom.capacity)
+
+
+    def _remember(self, msg_id: str):
+        """Put an ID at the fresh end of the LRU; the caller holds lock"""
+
+        self.recent[msg_id] = None
+        self.recent.move_to_end(msg_id)
+        if len(self.recent) > self.lru_size:
+            self.recent.popitem(last=False)
+
+
+    def partition(self, msg_ids: list) -> tuple:
+        """Sort IDs into the ones already stored, new ones, and unknowns
+
+        Parameters:
+        msg_ids (list): the MsgIDs about to be stored
+
+        Returns:
+        (tuple): (seen, new, unknown) lists of MsgIDs; seen are certainly
+            in the database, new certainly not, and unknown need a query
+        """
+
+        seen, new, unknown = [], [], []
+        with self.lock:
+            for msg_id in msg_ids:
+                if msg_id in self.recent:
+                    self.recent.move_to_end(msg_id)
+                    seen.append(msg_id)
+                elif self.bloom is not None and not self.bloom.might_contain(msg_id):
+                    new.append(msg_id)
+                else:
+                    unknown.append(msg_id)
+            self.hits += len(seen)
+            self.new += len(new)
+            self.misses += len(unknown)
+
+        return seen, new, unknown
+
+
+    def add(self, msg_ids: list):
+        """Record IDs that are now in the database (call after the commit)
+
+        Parameters:
+        msg_ids (list): the MsgIDs stored
+        """
+
+        with self.lock:
+            for msg_id in msg_ids:
+                self._remember(msg_id)
+                if self.bloom is not None:
+                    self.bloom.add(msg_id)
+
+
+    def discard(self, msg_ids: list):
+        """Forget IDs that have been deleted from the database
+
+        Parameters:
+        msg_ids (list): the MsgIDs deleted
+        """
+
+        with self.lock:
+            for msg_id in msg_ids:
+                self.recent.pop(msg_id, None)
+
+
+    def describe(self) -> str:
+        """The stats, for people"""
+
+        stats = self.stats()
+        return (f"Seen-ID cache: {stats['hit_rate']:.0%} answered without a lookup "
+                f"({stats['hits']} stored, {stats['new']} new, {stats['misses']} checked)")
+
+
+    def stats(self) -> dict:
+        """The lookup counters and the size of the cache
+
+        Returns:
+        (dict): hits (found in the LRU), new (ruled out by the Bloom
+            filter), misses (left to the database), hit_rate (the share
+            answered without a database check), lru entries and bloom
+            entries
+        """
+
+        with self.lock:
+            lookups = self.hits + self.new + self.misses
+            return {'hits': self.hits,
+                    'new': self.new,
+                    'misses': self.misses,
+                    'hit_rate': (self.hits + self.new) / lookups if lookups else 0.0,
+                    'lru': len(self.recent),
+                    'bloom': self.bloom.count if self.bloom is not None else 0}
@@ -185,7 +185,7 @@ class SettingsManager:
                 color: #a0a0a0;             /* Muted text color */
             }        
             
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background: #F7921E;
                 color: black;              /* black text */
             }
@@ -0,0 +1,443 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# sp_cli.py
+#
+# The command line version of Briefpoint, for headless machines and
+# cron. It shares the database and the fetch pipeline with the main
+# window but never imports PySide6.
+#
+#   python sp_cli.py fetch [CALLSIGN ...]
+#   python sp_cli.py poll [CALLSIGN ...]
+#   python sp_cli.py list [--all] [--dest CALLSIGN] [--since TIME] [--until TIME] [--limit N]
+#   python sp_cli.py search WORDS ... [--all] [--archive] [--limit N]
+#   python sp_cli.py ack MIDX ... [--undo]
+#   python sp_cli.py purge [--acked]
+#   python sp_cli.py archive [--days N]
+#   python sp_cli.py retain [--days N] [--max N] [--per-callsign N] [--save]
+#   python sp_cli.py compact [--stats] [--full]
+#   python sp_cli.py export [--all] [--since TIME] [--until TIME] [--format csv|json] [--output FILE]
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+from aprs_api import APRSError, archive_messages, ARCHIVE_AFTER_DAYS, configure_limits, flag_acked_for_purge, format_time, get_api_key, get_preference, get_watch_list, ingest, parse_callsigns, plan_batches, purge_messages, search_messages, SEARCH_LIMIT
+from circuit_breaker import CircuitOpenError
+from concurrent.futures import CancelledError
+from database import Database
+from datetime import datetime
+from http_client import HttpClient
+from poller import PollSchedule
+from retention import RetentionPolicy, apply_retention
+from seen_cache import SeenCache
+import threading
+import argparse
+import requests
+import signal
+import json
+import csv
+import sys
+import os
+import time
+
+# the most time one fetch may take, retries included
+FETCH_TIME_LIMIT_S = 120
+
+# how often poll applies the retention policy, in seconds
+RETENTION_INTERVAL = 3600
+
+# the columns list and export show, in order
+COLUMNS = ['MIdx', 'Acked', 'MsgID', 'MsgTime', 'MsgSource', 'MsgDest', 'MsgMessage']
+
+
+def retention_report(result: dict) -> str:
+    """One line on what a retention run deleted"""
+
+    reclaimed = result['age'] + result['quota'] + result['count']
+    return (f"Retention reclaimed {reclaimed} messages (age {result['age']}, "
+            f"per call sign {result['quota']}, count {result['count']}) in {result['seconds']:.1f} s.")
+
+
+def log(text: str, error: bool=False):
+    """Print a time-stamped line; errors go to stderr"""
+
+    stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"{stamp} {text}", file=sys.stderr if error else sys.stdout, flush=True)
+
+
+def parse_time(text: str) -> int:
+    """A local date and time from the command line, as epoch seconds
+
+    Accepts "YYYY-MM-DD", "YYYY-MM-DD HH:MM" or "YYYY-MM-DDTHH:MM:SS".
+    """
+
+    try:
+        return int(datetime.fromisoformat(text).timestamp())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a date and time: {text!r}")
+
+
+def message_filter(args) -> tuple:
+    """The WHERE clause and parameters for --all, --dest, --since and --until"""
+
+    where = ['Purge=0'] if args.all else ['Acked=0', 'Purge=0']
+    params = []
+    if getattr(args, 'dest', None):
+        where.append('upper(MsgDest) = ?')
+        params.append(args.dest.upper())
+    # MsgTime is indexed epoch seconds, so a time window is a range seek
+    if args.since is not None:
+        where.append('MsgTime >= ?')
+        params.append(args.since)
+    if args.until is not None:
+        where.append('MsgTime < ?')
+        params.append(args.until)
+    return ' and '.join(where), params
+
+
+def resolve_callsigns(db, callsigns: list) -> list:
+    """The call signs given on the command line, or else the watch list"""
+
+    return parse_callsigns(",".join(callsigns)) or get_watch_list(db)
+
+
+def resolve_api_key(db, args) -> str:
+    """The API key from --api-key, $APRS_API_KEY or the database, in that order"""
+
+    return args.api_key or os.environ.get('APRS_API_KEY') or get_api_key(db)
+
+
+def fetch_batch(db, batch: list, api_key: str, cancel: threading.Event) -> dict:
+    """Fetch one batch and log the outcome
+
+    Returns:
+    (dict): what ingest returned, or None if the fetch failed
+    """
+
+    try:
+        result = ingest(db, batch, api_key, cancel, time.monotonic() + FETCH_TIME_LIMIT_S)
+    except CancelledError:
+        log(f"{','.join(batch)}: cancelled", error=True)
+    except (APRSError, CircuitOpenError, requests.exceptions.RequestException) as e:
+        log(f"{','.join(batch)}: Retrieve Messages Failed. \"{e}\"", error=True)
+    else:
+        for callsign in batch:
+            log(f"{callsign}: Retrieved: {result['retrieved'].get(callsign, 0)}; New: {result['new'].get(callsign, 0)}")
+        return result
+    return None
+
+
+def cmd_fetch(db, args) -> int:
+    """Fetch the call signs once"""
+
+    callsigns = resolve_callsigns(db, args.callsigns)
+    if not callsigns:
+        log("No call signs given and the watch list is empty.", error=True)
+        return 2
+    api_key = resolve_api_key(db, args)
+    if not api_key:
+        log("No APRS API key; use --api-key or set APRS_API_KEY.", error=True)
+        return 2
+
+    configure_limits(db)
+    cancel = threading.Event()
+    failed = 0
+    for batch in plan_batches(callsigns):
+        if fetch_batch(db, batch, api_key, cancel) is None:
+            failed += 1
+    HttpClient().close()
+    return 1 if failed else 0
+
+
+def cmd_poll(db, args) -> int:
+    """Poll the call signs on the adaptive schedule until stopped"""
+
+    api_key = resolve_api_key(db, args)
+    if not api_key:
+        log("No APRS API key; use --api-key or set APRS_API_KEY.", error=True)
+        return 2
+
+    configure_limits(db)
+
+    # a long-running poller fetches the same call signs over and over,
+    # so loading the seen-ID cache pays for itself here
+    cache = SeenCache(lru_size=int(get_preference(db, 'SeenCacheSize', 5000)), reset=True)
+    cache.warm(db)
+
+    schedule = PollSchedule(floor=float(get_preference(db, 'PollFloor', 60)),
+                            ceiling=float(get_preference(db, 'PollCeiling', 900)))
+
+    # SIGTERM (systemd, docker stop) and Ctrl+C both end the loop cleanly
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    # the retention policy is applied between fetches, once an hour
+    next_retention = time.monotonic()
+
+    log("Polling; send SIGTERM or press Ctrl+C to stop.")
+    while not stop.is_set():
+        # the watch list may be edited in the main window meanwhile
+        callsigns = resolve_callsigns(db, args.callsigns)
+        if not callsigns:
+            log("No call signs given and the watch list is empty.", error=True)
+            return 2
+        schedule.set_callsigns(callsigns)
+
+        for batch in plan_batches(schedule.due()):
+            result = fetch_batch(db, batch, api_key, stop)
+            for callsign in batch:
+                schedule.record(callsign, result['new'].get(callsign, 0) if result else 0)
+
+        # rebuilt between fetches once the Bloom filter has filled
+        if cache.full:
+            cache.warm(db)
+
+        if time.monotonic() >= next_retention:
+            next_retention = time.monotonic() + RETENTION_INTERVAL
+            log(cache.describe())
+            policy = RetentionPolicy.from_preferences(db)
+            if policy.enabled:
+                result = apply_retention(db, policy, cancel=stop)
+                if result['age'] + result['quota'] + result['count']:
+                    log(retention_report(result))
+
+        wait = schedule.seconds_until_due()
+        stop.wait(schedule.floor if wait is None else wait)
+
+    HttpClient().close()
+    log(cache.describe())
+    log("Stopped.")
+    return 0
+
+
+def cmd_list(db, args) -> int:
+    """Print the messages, oldest first, as the main window lists them"""
+
+    where, params = message_filter(args)
+    order = 'Acked, MsgTime, MIdx' if args.all else 'MsgTime, MIdx'
+    qry = f"select {', '.join(COLUMNS)} from APRSMessages where {where} order by {order}"
+    if args.limit:
+        qry += ' limit ?'
+        params.append(args.limit)
+
+    for row in db.iter_query(qry + ';', params):
+        row['MsgTime'] = format_time(row['MsgTime'])
+        print('\t'.join('' if row[column] is None else str(row[column]) for column in COLUMNS))
+    return 0
+
+
+def cmd_search(db, args) -> int:
+    """Print the messages matching the words, best matches first"""
+
+    for row in search_messages(db, ' '.join(args.words), args.all or args.archive, args.limit, args.archive):
+        row['MsgTime'] = format_time(row['MsgTime'])
+        print('\t'.join('' if row[column] is None else str(row[column]) for column in COLUMNS))
+    return 0
+
+
+def cmd_ack(db, args) -> int:
+    """Acknowledge (or un-acknowledge) messages by MIdx"""
+
+    qry = 'update APRSMessages set Acked=? where MIdx=?;'
+    changed = db.execute_many(qry, [(0 if args.undo else 1, midx) for midx in args.midx])
+    print(f"{'Unacknowledged' if args.undo else 'Acknowledged'} {changed} of {len(args.midx)} messages.")
+    return 0 if changed == len(args.midx) else 1
+
+
+def cmd_purge(db, args) -> int:
+    """Delete the flagged messages; with --acked, flag the acknowledged ones first"""
+
+    with db.transaction():
+        if args.acked:
+            flag_acked_for_purge(db)
+        purged = purge_messages(db)
+    print(f"Purged {purged} messages.")
+    return 0
+
+
+def cmd_archive(db, args) -> int:
+    """Move the purged messages, and the acked ones older than --days, to the archive"""
+
+    days = args.days
+    if days is None:
+        days = float(get_preference(db, 'ArchiveAfterDays', ARCHIVE_AFTER_DAYS))
+    moved = archive_messages(db, days)
+    print(f"Archived {len(moved)} messages to {db.archiveName}.")
+    return 0
+
+
+def cmd_retain(db, args) -> int:
+    """Apply the retention policy once; the options override the saved one"""
+
+    policy = RetentionPolicy.from_preferences(db)
+    if args.days is not None:
+        policy.max_age_days = args.days
+    if args.max is not None:
+        policy.max_messages = args.max
+    if args.per_callsign is not None:
+        policy.max_per_callsign = args.per_callsign
+    if args.save:
+        policy.save(db)
+
+    if not policy.enabled:
+        print("No retention limits are set; nothing to do.")
+        return 0
+
+    print(f"Retention policy: {policy.describe()}.")
+    print(retention_report(apply_retention(db, policy)))
+    return 0
+
+
+def print_space(db):
+    """Print how much of each database file is in use"""
+
+    for stats in db.space_stats().values():
+        fragmentation = stats['fragmentation_percent']
+        fragmented = "fragmentation unavailable" if fragmentation is None else f"{fragmentation:.0f}% fragmented"
+        print(f"{stats['file']}: {stats['bytes'] / 1048576:.1f} MB, "
+              f"{stats['free_pages']} free pages ({stats['free_percent']:.1f}%), "
+              f"{fragmented}, auto_vacuum {stats['auto_vacuum']}")
+
+
+def cmd_compact(db, args) -> int:
+    """Release the free pages and refresh the statistics; with --stats, only report,
+    with --full, rewrite the files"""
+
+    print_space(db)
+    if args.stats:
+        return 0
+
+    result = db.compact(full=args.full)
+    for schema in ('main', 'archive'):
+        outcome = result[schema]
+        vacuumed = " (full VACUUM)" if outcome['vacuumed'] else ""
+        print(f"{schema}: released {outcome['released_pages']} pages, "
+              f"{outcome['released_bytes'] / 1048576:.1f} MB{vacuumed}")
+        if outcome['needs_vacuum']:
+            print(f"{schema}: auto_vacuum is not incremental; run compact --full once to convert it")
+    print(f"Compacted in {result['seconds']:.1f} s.")
+    print_space(db)
+    return 0
+
+
+def cmd_export(db, args) -> int:
+    """Write the messages out as CSV or JSON"""
+
+    where, params = message_filter(args)
+    qry = f"select {', '.join(COLUMNS)} from APRSMessages where {where} order by MsgTime, MIdx;"
+    exported = 0
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        if args.format == 'json':
+            # JSON keeps the epoch seconds
+            rows = db.fetch_all(qry, params)
+            exported = len(rows)
+            json.dump(rows, out, indent=2)
+            out.write('\n')
+        else:
+            # CSV is for people and spreadsheets; it is written as it is read
+            writer = csv.DictWriter(out, fieldnames=COLUMNS)
+            writer.writeheader()
+            for row in db.iter_query(qry, params):
+                row['MsgTime'] = format_time(row['MsgTime'])
+                writer.writerow(row)
+                exported += 1
+    finally:
+        if args.output:
+            out.close()
+
+    if args.output:
+        print(f"Exported {exported} messages to {args.output}.")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """The command line: global options and one sub-parser per command"""
+
+    parser = argparse.ArgumentParser(prog='sp_cli', description="Briefpoint APRS messaging without the window.")
+    parser.add_argument('--db', default="briefpoint.db", help="the database file (default: briefpoint.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fetch = commands.add_parser('fetch', help="fetch new messages once")
+    fetch.add_argument('callsigns', nargs='*', help="call signs to fetch (default: the watch list)")
+    fetch.add_argument('--api-key', help="APRS API key (default: $APRS_API_KEY, then the database)")
+    fetch.set_defaults(run=cmd_fetch)
+
+    poll = commands.add_parser('poll', help="keep polling on the adaptive schedule until stopped")
+    poll.add_argument('callsigns', nargs='*', help="call signs to poll (default: the watch list)")
+    poll.add_argument('--api-key', help="APRS API key (default: $APRS_API_KEY, then the database)")
+    poll.set_defaults(run=cmd_poll)
+
+    list_ = commands.add_parser('list', help="print the messages, tab separated")
+    list_.add_argument('--all', action='store_true', help="include acknowledged messages")
+    list_.add_argument('--dest', help="only messages to this call sign")
+    list_.add_argument('--since', type=parse_time, help="only messages at or after this local time")
+    list_.add_argument('--until', type=parse_time, help="only messages before this local time")
+    list_.add_argument('--limit', type=int, help="print at most this many")
+    list_.set_defaults(run=cmd_list)
+
+    search = commands.add_parser('search', help="print the messages matching the words, best first")
+    search.add_argument('words', nargs='+', help="words to find in the text or call signs; the last may be a prefix")
+    search.add_argument('--all', action='store_true', help="include acknowledged messages")
+    search.add_argument('--archive', action='store_true', help="search the archive instead")
+    search.add_argument('--limit', type=int, default=SEARCH_LIMIT, help=f"print at most this many (default: {SEARCH_LIMIT})")
+    search.set_defaults(run=cmd_search)
+
+    ack = commands.add_parser('ack', help="acknowledge messages by MIdx")
+    ack.add_argument('midx', nargs='+', type=int, help="the MIdx of each message (see list)")
+    ack.add_argument('--undo', action='store_true', help="clear the acknowledgement instead")
+    ack.set_defaults(run=cmd_ack)
+
+    purge = commands.add_parser('purge', help="delete the messages flagged for deletion")
+    purge.add_argument('--acked', action='store_true', help="flag the acknowledged messages first")
+    purge.set_defaults(run=cmd_purge)
+
+    archive = commands.add_parser('archive', help="move acked and purged messages to the archive")
+    archive.add_argument('--days', type=float, help="archive acked messages older than this "
+                                                    f"(default: the ArchiveAfterDays preference, else {ARCHIVE_AFTER_DAYS})")
+    archive.set_defaults(run=cmd_archive)
+
+    retain = commands.add_parser('retain', help="delete the messages the retention policy does not keep")
+    retain.add_argument('--days', type=float, help="delete messages older than this many days (0: no limit)")
+    retain.add_argument('--max', type=int, help="keep at most this many messages (0: no limit)")
+    retain.add_argument('--per-callsign', type=int, help="keep at most this many per call sign (0: no limit)")
+    retain.add_argument('--save', action='store_true', help="save the limits for later runs and the window")
+    retain.set_defaults(run=cmd_retain)
+
+    compact = commands.add_parser('compact', help="release the free space in the database files")
+    compact.add_argument('--stats', action='store_true', help="only show the free space and fragmentation")
+    compact.add_argument('--full', action='store_true', help="rewrite the files with VACUUM, which also defragments them")
+    compact.set_defaults(run=cmd_compact)
+
+    export = commands.add_parser('export', help="write the messages as CSV or JSON")
+    export.add_argument('--all', action='store_true', help="include acknowledged messages")
+    export.add_argument('--since', type=parse_time, help="only messages at or after this local time")
+    export.add_argument('--until', type=parse_time, help="only messages before this local time")
+    export.add_argument('--format', choices=['csv', 'json'], default='csv')
+    export.add_argument('--output', '-o', help="file to write (default: standard output)")
+    export.set_defaults(run=cmd_export)
+
+    return parser
+
+
+def main(argv: list=None) -> int:
+
+    args = build_parser().parse_args(argv)
+
+    db = Database(args.db)
+    if db is None:
+        log(f"Could not open the database {args.db}.", error=True)
+        return 2
+
+    try:
+        return args.run(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,23 +12,69 @@
 #
 ##############################################################################
 
-from PySide6.QtWidgets import QApplication, QMainWindow, QInputDialog, QMessageBox, QSplashScreen, QTableWidgetItem
-from PySide6.QtGui import QPixmap, Qt, QCursor
+# started first so the startup report covers the imports
+from startup_timer import STARTUP
+
+from PySide6.QtWidgets import QApplication, QMainWindow, QInputDialog, QLabel, QMessageBox, QSplashScreen
+from PySide6.QtGui import QPixmap, Qt
+from PySide6.QtCore import QThreadPool, QTimer
 from database import Database
 from ui.sp_aprs_ui import Ui_MainWindow as MainWindowUI
-from about import AboutDialog
+from resources import load_resources
 from settings import SettingsManager
-from datetime import datetime
-import webbrowser
-import requests
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN
+from aprs_api import archive_messages, configure_limits, flag_acked_for_purge, get_api_key, get_preference, get_watch_list, parse_callsigns, plan_batches, purge_messages, set_preference, ARCHIVE_AFTER_DAYS, SEARCH_LIMIT
+from fetch_worker import CacheWorker, FetchWorker, ProbeWorker, TaskWorker
+from message_model import MessageTableModel
+from poller import PollSchedule
+from retention import RetentionPolicy, apply_retention
+from seen_cache import SeenCache
+from functools import partial
 import sys
 import os
+import threading
+
+# The about dialog, webbrowser and requests (through http_client) are
+# imported where they are first used, after the window is on screen.
+
+STARTUP.mark('imports')
 
 
 
 class MainWindow(QMainWindow):
+
+    # how long shutdown() waits for fetches in progress
+    SHUTDOWN_WAIT_MS = 5000
+
+    # how often the polling schedule is checked for call signs that are due
+    POLL_TICK_MS = 1000
+
+    # how often the internet is checked again while we are offline
+    PROBE_INTERVAL_MS = 30000
+
+    # the most time one fetch may take, retries included
+    FETCH_TIME_LIMIT_S = 120
+
+    # how often the circuit breaker's state is refreshed in the status bar
+    BREAKER_TICK_MS = 1000
+
+    # how long typing in the search box must pause before the search runs
+    SEARCH_DELAY_MS = 300
+
+    # how often acked and purged messages are moved to the archive
+    ARCHIVE_INTERVAL_MS = 15 * 60 * 1000
+
+    # how often the retention policy is applied
+    RETENTION_INTERVAL_MS = 60 * 60 * 1000
+
+    # how often free pages are released and the statistics refreshed,
+    # besides after every archive move, retention run and purge
+    COMPACT_INTERVAL_MS = 6 * 60 * 60 * 1000
+
     def __init__(self, cmdline_dbfile = None):
         super().__init__()
+        load_resources()
+        self.painted = False
         self.ui = MainWindowUI()
         self.ui.setupUi(self)
         self.db_name = None
@@ -41,36 +87,21 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Briefpoint 1.2")
         self.online = True
 
-        # Splash Screen ============================================
-        pixmap = QPixmap(u":/Main/briefpoint_logo.png")
-        splash = QSplashScreen(pixmap)
-        splash.show()
-
-        # for i in range(1, 2):
-            # time.sleep(1)  # Simulate loading tasks
-            # splash.showMessage(f"Loading... {i * 10}%")
-        QApplication.processEvents()
-        if not self.is_active_internet():
-            result = QMessageBox.critical(self,
-                                          "Briefpoint: Internet Required",
-                                          "Briefpoint was unable to access the Internet.\nInternet is required to retrieve messages.\n\nOpen anyway?",
-                                          QMessageBox.Yes | QMessageBox.No)
-            if result == QMessageBox.Yes:
-                self.online = False
-
-        splash.finish(self)
-        # End Splash Screen ============================================
-
+        # the internet check runs in the background once the window is up;
+        # see check_connectivity and set_online
 
         self.ui.actionExit.triggered.connect(self.mnuFileExit_clicked)
         self.ui.actionAbout.triggered.connect(self.mnuFileAbout_clicked)
         self.ui.actionDocumentation.triggered.connect(self.menuFileDoc_clicked)
 
-        self.ui.tblMessages.itemChanged.connect(self.checkbox_click)
-
         self.ui.actionPurge_ALL_Messages.triggered.connect(self.mnuMsgPurgeAll_clicked)
         self.ui.actionPurge_Selected_Messages.triggered.connect(self.mnuMsgPurgeSelected_clicked)
         self.ui.actionEnter_APRS_API_Key.triggered.connect(self.mnuMsgAPIKey_clicked)
+        self.ui.actionEdit_Watch_List.triggered.connect(self.mnuMsgWatchList_clicked)
+        self.ui.actionAuto_Poll.toggled.connect(self.mnuMsgAutoPoll_toggled)
+        self.ui.actionSearch_Archive.toggled.connect(self.mnuMsgSearchArchive_toggled)
+        self.ui.actionRetention_Policy.triggered.connect(self.mnuMsgRetention_clicked)
+        self.ui.actionDatabase_Space.triggered.connect(self.mnuMsgDatabaseSpace_clicked)
 
         self.ui.butClose.clicked.connect(self.mnuFileExit_clicked)
         self.ui.butShowAll.clicked.connect(self.butShowAll_click)
@@ -79,69 +110,310 @@ class MainWindow(QMainWindow):
 
 
         self.ui.butFetch.clicked.connect(self.butFetch_click)
+        self.ui.butCancel.clicked.connect(self.butCancel_click)
         self.ui.txtCallsign.returnPressed.connect(self.butFetch_click)
-        if not self.online:
-            self.ui.butFetch.setEnabled(False)
         
 
         self.setStyleSheet(SettingsManager.WIDGETSTYLES)
 
         self.db = Database()
+        STARTUP.mark('Database open')
+        self.model = MessageTableModel(self.db, self)
+        self.model.acked.connect(self.checkbox_click)
+        self.ui.tblMessages.setModel(self.model)
         self.populate_fields()
+        STARTUP.mark('populate_fields')
+
+        # the search runs once typing pauses, not on every keystroke
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.run_search)
+        self.ui.txtSearch.textChanged.connect(self.search_timer.start)
+        self.ui.txtSearch.returnPressed.connect(self.run_search)
+
+        # fetches run on the pool; keyed by call sign while in flight
+        self.threadpool = QThreadPool.globalInstance()
+        self.fetches = {}
+        self.shutting_down = False
+
+        # the MsgIDs already stored, so fetches can skip them without SQL;
+        # until it is loaded every ID is simply checked in the database
+        # (it is loaded in the background once the window is painted)
+        SeenCache(lru_size=int(get_preference(self.db, 'SeenCacheSize', 5000)), reset=True)
+
+        # one request budget and one circuit breaker for every aprs.fi
+        # request; the breaker's state is shown at the right of the status bar
+        configure_limits(self.db)
+        self.breaker_label = QLabel()
+        self.ui.statusbar.addPermanentWidget(self.breaker_label)
+        self.breaker_timer = QTimer(self)
+        self.breaker_timer.setInterval(self.BREAKER_TICK_MS)
+        self.breaker_timer.timeout.connect(self.show_breaker_state)
+        self.breaker_timer.start()
+        self.show_breaker_state()
+
+        # scheduled polling of the watch list; polled call signs are kept
+        # in self.polling until their fetch reports back
+        self.schedule = PollSchedule(floor=float(get_preference(self.db, 'PollFloor', 60)),
+                                     ceiling=float(get_preference(self.db, 'PollCeiling', 900)))
+        self.polling = set()
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(self.POLL_TICK_MS)
+        self.poll_timer.timeout.connect(self.poll_tick)
+        self.ui.actionAuto_Poll.setChecked(get_preference(self.db, 'AutoPoll') == '1')
+
+        # online/offline is decided live: by a background check once the
+        # window is painted, by every fetch's outcome, and by re-checks
+        # while offline
+        self.probing = False
+        self.startup_reported = False
+        self.probe_timer = QTimer(self)
+        self.probe_timer.setInterval(self.PROBE_INTERVAL_MS)
+        self.probe_timer.timeout.connect(self.check_connectivity)
+
+        # acked and purged messages move to the archive in the background,
+        # once the window is painted and then every ARCHIVE_INTERVAL_MS
+        self.archiver = None
+        self.archive_timer = QTimer(self)
+        self.archive_timer.setInterval(self.ARCHIVE_INTERVAL_MS)
+        self.archive_timer.timeout.connect(self.start_archive)
+
+        # the retention policy caps the history kept; it is applied in
+        # the background too, in small chunks
+        self.retainer = None
+        self.retention_timer = QTimer(self)
+        self.retention_timer.setInterval(self.RETENTION_INTERVAL_MS)
+        self.retention_timer.timeout.connect(self.start_retention)
+
+        # deleted messages leave free pages behind; they are handed back
+        # to the file system a few at a time in the background
+        self.compactor = None
+        self.measuring = False      # space_stats is reading the files
+        self.compact_timer = QTimer(self)
+        self.compact_timer.setInterval(self.COMPACT_INTERVAL_MS)
+        self.compact_timer.timeout.connect(self.start_compaction)
+
+
+    def paintEvent(self, event):
+        """Start the deferred work once the window's first frame is drawn"""
+
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            QTimer.singleShot(0, self.first_paint)
+
+
+    def first_paint(self):
+        """The window is on screen; report the startup time and start the background work"""
+
+        STARTUP.mark('first paint')
+        STARTUP.finish_cprofile()
+        if STARTUP.profiling:
+            print(STARTUP.report(), file=sys.stderr)
+
+        if self.shutting_down:
+            return
+        self.threadpool.start(CacheWorker(self.db))
+        self.check_connectivity()
+        self.archive_timer.start()
+        self.start_archive()
+        self.retention_timer.start()
+        self.start_retention()
+        self.compact_timer.start()
 
 
-    def is_active_internet(self, node: str="https://www.google.com") -> bool:
-        try:
-            response = requests.get(node, timeout=3)
-            return response.status_code == 200
-        except requests.RequestException:
-            return False
+    def start_archive(self):
+        """Move acked and purged messages to the archive, unless a move is running"""
 
+        if self.archiver is not None or self.shutting_down:
+            return
 
-    def populate_fields(self):
-        """Read the data from the APRSmessages database table and fill this form"""
+        days = float(get_preference(self.db, 'ArchiveAfterDays', ARCHIVE_AFTER_DAYS))
+        cancel = threading.Event()
+        self.archiver = TaskWorker(self.db, partial(archive_messages, self.db, days, cancel=cancel), cancel)
+        self.archiver.signals.finished.connect(self.archive_finished)
+        self.archiver.signals.failed.connect(self.archive_failed)
+        self.threadpool.start(self.archiver)
 
-        # prevent changes to the checkboxes while populating the table
-        self.refreshing = True
 
-        if self.showall:
-            qry = 'select MIdx, Acked as "ACKed", MsgID, MsgTime, MsgSource, MsgMessage as "Message" from APRSMessages where Purge=0 order by Acked, MsgTime;'
+    def archive_finished(self, moved: list):
+        """Drop the moved messages from the list"""
+
+        self.archiver = None
+        self.model.remove_messages(moved)
+        if moved:
+            self.ui.statusbar.showMessage(f"Archived {len(moved)} messages.")
+            self.start_compaction()
+
+
+    def archive_failed(self, error: str):
+        self.archiver = None
+        self.ui.statusbar.showMessage(f'Archiving failed. "{error}"')
+
+
+    def start_retention(self):
+        """Apply the retention policy, unless it is running or sets no limits"""
+
+        if self.retainer is not None or self.shutting_down:
+            return
+
+        policy = RetentionPolicy.from_preferences(self.db)
+        if not policy.enabled:
+            return
+        cancel = threading.Event()
+        self.retainer = TaskWorker(self.db, partial(apply_retention, self.db, policy, cancel=cancel), cancel)
+        self.retainer.signals.finished.connect(self.retention_finished)
+        self.retainer.signals.failed.connect(self.retention_failed)
+        self.threadpool.start(self.retainer)
+
+
+    def retention_finished(self, result: dict):
+        """Drop the deleted messages from the list and report what was reclaimed"""
+
+        self.retainer = None
+        self.model.remove_messages(result['midx'])
+        reclaimed = result['age'] + result['quota'] + result['count']
+        if reclaimed:
+            self.ui.statusbar.showMessage(f"Retention reclaimed {reclaimed} messages "
+                                          f"(age {result['age']}, per call sign {result['quota']}, "
+                                          f"count {result['count']}) in {result['seconds']:.1f} s.")
+            self.start_compaction()
+
+
+    def retention_failed(self, error: str):
+        self.retainer = None
+        self.ui.statusbar.showMessage(f'Retention failed. "{error}"')
+
+
+    def start_compaction(self, full: bool=False):
+        """Release free pages and refresh the statistics, unless that is running
+
+        Parameters:
+        full (bool): True to rewrite the files with VACUUM; only ever at
+            the user's request, since acks wait until it is done (optional)
+        """
+
+        if self.shutting_down:
+            return
+        if self.compactor is not None:
+            if full:
+                self.ui.statusbar.showMessage("The database is being compacted; try again in a moment.")
+            return
+
+        if full:
+            self.ui.statusbar.showMessage("Rewriting the database files...")
+        cancel = threading.Event()
+        self.compactor = TaskWorker(self.db, partial(self.db.compact, cancel=cancel, full=full), cancel)
+        self.compactor.signals.finished.connect(self.compaction_finished)
+        self.compactor.signals.failed.connect(self.compaction_failed)
+        self.threadpool.start(self.compactor)
+
+
+    def compaction_finished(self, result: dict):
+        self.compactor = None
+        released = result['main']['released_bytes'] + result['archive']['released_bytes']
+        if result['main']['vacuumed'] or result['archive']['vacuumed']:
+            self.ui.statusbar.showMessage(f"Rewrote the database files: released {released / 1048576:.1f} MB.")
+        elif released:
+            self.ui.statusbar.showMessage(f"Compacted the database: released {released / 1048576:.1f} MB.")
+
+
+    def compaction_failed(self, error: str):
+        self.compactor = None
+        self.ui.statusbar.showMessage(f'Compacting the database failed. "{error}"')
+
+
+    def check_connectivity(self):
+        """Check for an internet connection on a pool thread
+
+        Until the answer comes back we assume we are online; a fetch that
+        fails on the network sets us offline sooner.
+        """
+
+        if self.probing or self.shutting_down: return
+
+        self.probing = True
+        worker = ProbeWorker()
+        worker.signals.checked.connect(self.probe_finished)
+        self.probe = worker
+        self.threadpool.start(worker)
+
+
+    def probe_finished(self, online: bool):
+        """The background internet check has an answer"""
+
+        self.probing = False
+        self.set_online(online)
+
+        # the first answer completes the startup profile
+        if not self.startup_reported:
+            STARTUP.mark('connectivity probe')
+            self.write_startup_report()
+
+
+    def set_online(self, online: bool):
+        """Enable or disable fetching as the internet comes and goes
+
+        Called with the outcome of every internet check and every fetch.
+        While offline the internet is checked again every
+        PROBE_INTERVAL_MS.
+        """
+
+        if self.shutting_down: return
+
+        was_online = self.online
+        self.online = online
+        self.ui.butFetch.setEnabled(online)
+
+        if online:
+            self.probe_timer.stop()
+            if not was_online:
+                self.ui.statusbar.showMessage("Back online.")
+        else:
+            if not self.probe_timer.isActive():
+                self.probe_timer.start()
+            if was_online:
+                self.ui.statusbar.showMessage("Offline: the Internet is required to retrieve messages.")
+
+
+    def show_breaker_state(self):
+        """Show the circuit breaker's state at the right of the status bar"""
+
+        breaker = CircuitBreaker()
+        state = breaker.state
+        if state == CLOSED:
+            self.breaker_label.setText("aprs.fi: OK")
+        elif state == OPEN:
+            self.breaker_label.setText(f"aprs.fi: paused ({breaker.retry_in():.0f}s)")
         else:
-            qry = 'select MIdx, Acked as "ACKed", MsgID, MsgTime, MsgSource, MsgMessage as "Message" from APRSMessages where Acked=0 and Purge=0 order by MsgTime;'
-        rows = self.db.fetch_all(qry)
-
-        # build the table headers from the column names in the database
-        # cols = [description[0] for description in self.db.cursor.description]
-        cols = ['MIdx', 'ACKed', 'MsgID', 'MsgTime', 'MsgSource', 'Message']
-        self.ui.tblMessages.setColumnCount(len(cols))
-        self.ui.tblMessages.setRowCount(len(rows))
-        self.ui.tblMessages.setHorizontalHeaderLabels(cols)
-
-        # populate the data
-        # for each row, fill the data cell by cell
-        for r_idx, r_dta in enumerate(rows):
-            strikethru = False
-            for c_idx, c_name in enumerate(cols):
-                value = r_dta.get(c_name,"")
-
-                # if we're in column 1, put a checkbox there instead of the 0 or 1
-                if c_idx == 1:
-                    checkbox = QTableWidgetItem()
-                    checkbox.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    checkbox.setFlags(checkbox.flags() | Qt.ItemIsUserCheckable)
-                    checkbox.setCheckState(Qt.Unchecked if value == 0 else Qt.Checked)
-                    self.ui.tblMessages.setItem(r_idx,c_idx,checkbox)
-
-                else:
-                    self.ui.tblMessages.setItem(r_idx,c_idx,QTableWidgetItem(str(value)))
-            
+            self.breaker_label.setText("aprs.fi: retrying")
+
+
+    def write_startup_report(self):
+        """Write the profiling report, once; a no-op unless profiling is on"""
+
+        if self.startup_reported:
+            return
+        self.startup_reported = True
+        STARTUP.write_report()
+
+
+    def populate_fields(self):
+        """Read the data from the APRSmessages database table and fill this form
+
+        The model only reads the rows the table actually shows; see
+        MessageTableModel. Later changes update the model in place
+        rather than coming back through here.
+        """
+
+        self.model.reload()
+
         self.ui.tblMessages.resizeColumnsToContents()
         self.ui.tblMessages.hideColumn(0)   # hides the MIdx field/column
 
         self.ui.statusbar.showMessage(f"")
 
-        self.refreshing = False
-
 
     def butShowAll_click(self):
         if self.showall:
@@ -152,116 +424,182 @@ class MainWindow(QMainWindow):
             self.showall = True
             self.ui.butShowAll.setText("Hide ACK'd")
         
-        self.populate_fields()
+        self.model.set_show_all(self.showall)
+        self.show_search_count()
+
+
+    def run_search(self):
+        """List the messages matching the search box, best matches first"""
+
+        self.search_timer.stop()
+        self.model.set_search(self.ui.txtSearch.text())
+        self.show_search_count()
 
 
+    def show_search_count(self):
+        """Say in the status bar how many messages the search found"""
+
+        if self.model.searching:
+            count = self.model.rowCount()
+            more = "+" if count >= SEARCH_LIMIT else ""
+            self.ui.statusbar.showMessage(f"Found {count}{more} messages.")
+
 
     def butFetch_click(self):
-        """Poll the aprs.fi website for any new messages."""
+        """Poll the aprs.fi website for any new messages.
+
+        The call signs come from the call sign field, which may hold
+        several separated by commas, or else from the watch list. They
+        are packed into as few API calls as aprs.fi allows and each call
+        runs on a FetchWorker in the thread pool; fetch_finished or
+        fetch_failed picks up the result.
+        """
 
-        if not self.online: return
+        if not self.online or self.shutting_down: return
 
         # Validate the user input
-        callsign = self.ui.txtCallsign.text().strip()
-        if not callsign:
-            QMessageBox.information(self, "Briefpoint: Missing Data", "A call sign is required.",
+        callsigns = parse_callsigns(self.ui.txtCallsign.text())
+        if not callsigns:
+            callsigns = get_watch_list(self.db)
+        if not callsigns:
+            QMessageBox.information(self, "Briefpoint: Missing Data", "A call sign or a watch list is required.",
                                     QMessageBox.Ok, QMessageBox.Ok)
             return
 
-        aprs_api_key = None
         # Fetch API key
-        qry = "select value from Preferences where key = 'APRSAPIKey';"
-        rows = self.db.fetch_many(1,qry)
-        if len(rows) == 1:
-            aprs_api_key = rows[0]['value'] 
+        aprs_api_key = get_api_key(self.db)
         if not aprs_api_key:
             QMessageBox.warning(self, "Briefpoint: Configuration Error", "APRS API key is missing.",
                                 QMessageBox.Ok, QMessageBox.Ok)
             return
 
-        # Prepare API URL
-        api_url = f"https://api.aprs.fi/api/get?what=msg&dst={callsign}&apikey={aprs_api_key}&format=json"
+        self.start_fetch(callsigns, aprs_api_key)
 
-        try:
-            QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
-            # Fetch messages from the API
-            response = requests.get(api_url)
-            response.raise_for_status()
-            json_output = response.json()
-
-            if json_output['result'] == 'fail':
-                self.ui.statusbar.showMessage(f'Retrieve Messages Failed. "{json_output['description']}"')
-                QApplication.restoreOverrideCursor()
-
-                return
-            
-            # Extract messages
-            messages = json_output.get('entries', [])
-            retrieved_count = len(messages)
-
-            # Prepare data for insertion
-            new_messages = []
-            for msg in messages:
-                msg_id = msg['messageid']
-                # Check if the message already exists in the database
-                qry = "SELECT MIdx FROM APRSMessages WHERE MsgID = ?;"
-                if not self.db.fetch_all(qry, [msg_id]):
-                    dt_obj = datetime.fromtimestamp(int(msg['time']))
-                    msg_time = dt_obj.strftime("%Y-%m-%d %H:%M")
-                    new_messages.append((msg_id, msg_time, msg['srccall'], msg['message'], 0))
-
-            # Insert new messages into the database
-            new_count = len(new_messages)
-            if new_messages:
-                insert_qry = """
-                    INSERT INTO APRSMessages (MsgID, MsgTime, MsgSource, MsgMessage, Acked, Purge)
-                    VALUES (?, ?, ?, ?, ?, 0);
-                """
-                self.db.execute_many(insert_qry, new_messages)
-
-            # Update the UI
-            self.populate_fields()
-            self.ui.statusbar.showMessage(f"Retrieved: {retrieved_count}; New: {new_count}")
-
-        except requests.exceptions.RequestException as e:
-            QMessageBox.critical(self, "Briefpoint: Network Error", f"Failed to fetch messages: {e}",
-                                QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
-        except Exception as e:
-            QMessageBox.critical(self, "Briefpoint: Error", f"An error occurred: {e}",
-                                QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
 
-        QApplication.restoreOverrideCursor()
+    def start_fetch(self, callsigns: list, aprs_api_key: str):
+        """Hand the call signs to FetchWorkers, one per batch
 
-    def checkbox_click(self, item: QTableWidgetItem):
-        """The user checked the box in the Acked column"""
+        Parameters:
+        callsigns (list): the call signs to fetch
+        aprs_api_key (str): the user's APRS API key
+        """
+
+        # one request per call sign is enough
+        callsigns = [callsign for callsign in callsigns if callsign not in self.fetches]
+        if not callsigns:
+            return
 
-        # make sure the user clicked in the checkbox and not somewhere else on the row
-        # and make sure we're not just refreshing the table
-        if item.column() == 1 and not self.refreshing:
-            # this is probably irrelevant because we're not going to show the "checked" ones anyway
-            status = 1 if item.checkState() == Qt.Checked else 0
-            
-            # figure out what the MIdx of this row is (it's in column 0)
-            mid_item = self.ui.tblMessages.item(item.row(),0)
-            mid = int(mid_item.text())
+        for batch in plan_batches(callsigns):
+            worker = FetchWorker(self.db, batch, aprs_api_key, self.FETCH_TIME_LIMIT_S)
+            worker.signals.finished.connect(self.fetch_finished)
+            worker.signals.failed.connect(self.fetch_failed)
+            for callsign in batch:
+                self.fetches[callsign] = worker
+            self.threadpool.start(worker)
 
-            # change this message to acknowledged in the database
-            qry = 'update APRSMessages set Acked=? where MIdx=?;'
-            params = [status,mid]
-            self.db.execute_query(qry,params)
+        self.ui.butCancel.setEnabled(True)
+        self.ui.statusbar.showMessage(f"Fetching messages for {', '.join(callsigns)}...")
 
-            # get the messageid and let the user know what happened
-            msg_id_item = self.ui.tblMessages.item(item.row(),2)
-            msg_id = msg_id_item.text()
 
-            self.populate_fields()
-            self.ui.statusbar.showMessage(f"MsgID {msg_id} acknowledged.")
+    def butCancel_click(self):
+        """Cancel every fetch in flight
+
+        Each worker reports back through fetch_failed as 'cancelled'.
+        """
+
+        for worker in set(self.fetches.values()):
+            worker.cancel()
+        self.ui.statusbar.showMessage("Cancelling...")
+
+
+    def poll_tick(self):
+        """Fetch the watched call signs whose poll is due"""
+
+        if not self.online or self.shutting_down: return
+
+        aprs_api_key = get_api_key(self.db)
+        if not aprs_api_key:
+            return
+
+        # a call sign already being fetched by hand is polled when that ends
+        due = [callsign for callsign in self.schedule.due() if callsign not in self.fetches]
+        self.polling.update(due)
+        self.start_fetch(due, aprs_api_key)
+
+
+    def fetch_finished(self, result: dict):
+        """A FetchWorker stored its messages; show them"""
+
+        self.set_online(True)
+        for callsign in result['callsigns']:
+            self.fetches.pop(callsign, None)
+            self.polling.discard(callsign)
+            self.schedule.record(callsign, result['new'].get(callsign, 0))
+        self.ui.butCancel.setEnabled(bool(self.fetches))
+        self.show_breaker_state()
+
+        # Update the UI
+        self.model.insert_messages(result['midx'])
+        retrieved_count = sum(result['retrieved'].values())
+        new_count = sum(result['new'].values())
+        self.ui.statusbar.showMessage(f"Retrieved: {retrieved_count}; New: {new_count}")
+        self.ui.statusbar.setToolTip(SeenCache().describe())
+
+        # the seen-ID cache outgrew its Bloom filter; rebuild it off the fetch
+        if SeenCache().full:
+            self.threadpool.start(CacheWorker(self.db))
+
+
+    def fetch_failed(self, callsigns: list, kind: str, error: str):
+        """A FetchWorker could not complete; tell the user why"""
+
+        polled = False
+        for callsign in callsigns:
+            self.fetches.pop(callsign, None)
+            if callsign in self.polling:
+                polled = True
+                self.polling.discard(callsign)
+            self.schedule.record(callsign, 0)
+        self.ui.butCancel.setEnabled(bool(self.fetches))
+        self.show_breaker_state()
+
+        if kind == 'cancelled':
+            self.ui.statusbar.showMessage("Fetch cancelled.")
+            return
+
+        # aprs.fi answered, so the network is fine; otherwise we may be offline
+        if kind == 'api':
+            self.set_online(True)
+        elif kind == 'network':
+            self.set_online(False)
+
+        # nobody is waiting on a scheduled poll, so don't pop up a dialog;
+        # an open breaker is already shown in the status bar
+        if kind in ('api', 'circuit') or polled:
+            self.ui.statusbar.showMessage(f'Retrieve Messages Failed. "{error}"')
+        elif kind == 'network':
+            QMessageBox.critical(self, "Briefpoint: Network Error", f"Failed to fetch messages: {error}",
+                                QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
+        else:
+            QMessageBox.critical(self, "Briefpoint: Error", f"An error occurred: {error}",
+                                QMessageBox.StandardButton.Ok, QMessageBox.StandardButton.Ok)
+
+    def checkbox_click(self, mid: int, msg_id: str, status: int):
+        """The user checked the box in the Acked column
+
+        The model has already saved the change to the database and
+        moved the row.
+        """
+
+        self.ui.statusbar.showMessage(f"MsgID {msg_id} acknowledged.")
 
 
     def mnuFileAbout_clicked(self):
         """Your basic everyday about box
         """
 
+        from about import AboutDialog
+
         form = AboutDialog()
         form.exec()
 
@@ -271,6 +609,8 @@ class MainWindow(QMainWindow):
         
         The documentation is in PDF format and stored in its own file.
         """
+        import webbrowser
+
         doc_path = "Briefpoint_Documentation.pdf"
         doc_uri = f"file:///{os.path.abspath(doc_path)}"
         webbrowser.open(doc_uri)
@@ -284,10 +624,13 @@ class MainWindow(QMainWindow):
                                       "This will purge messages from the database that have been previously flagged for deletion.\nThis action cannot be undone.\n\nAre you sure?",
                                       QMessageBox.Yes | QMessageBox.No)
         if result == QMessageBox.Yes:
-            qry = "delete from APRSMessages where Purge=1;"
-            self.db.execute_query(qry)
+            purged = purge_messages(self.db)
+            self.ui.statusbar.showMessage(f"Purged {purged} messages.")
 
-            self.populate_fields()
+            # flagged messages are never listed, so the table is unchanged;
+            # the space they took is released in the background
+            if purged:
+                self.start_compaction()
 
 
     def mnuMsgPurgeSelected_clicked(self):
@@ -298,10 +641,12 @@ class MainWindow(QMainWindow):
                                       "This will delete acknowledge messages from the database.\nThe messages will still be in the database, but you will not be able to access them.\nThis action cannot be undone.\n\nAre you sure?",
                                       QMessageBox.Yes | QMessageBox.No)
         if result == QMessageBox.Yes:
-            qry = "update APRSMessages set Purge=1 where Acked=1;"
-            self.db.execute_query(qry)
+            flag_acked_for_purge(self.db)
+
+            self.model.remove_acked()
 
-            self.populate_fields()
+            # flagged messages are moved to the archive straight away
+            self.start_archive()
 
 
     def mnuMsgAPIKey_clicked(self):
@@ -325,6 +670,128 @@ class MainWindow(QMainWindow):
                 qry = "insert into Preferences (key, value) values ('APRSAPIKey', ?);"
             values = [result.strip()]
             self.db.execute_query(qry,values)
+
+
+    def mnuMsgWatchList_clicked(self):
+        """Allow the user to edit the call signs fetched when the call sign field is empty."""
+
+        watch_list = ", ".join(get_watch_list(self.db))
+
+        result, ok = QInputDialog.getText(self,
+                                      "Briefpoint: Watch List",
+                                      "Enter the call signs to watch, separated by commas:",
+                                      text=watch_list)
+        if ok:
+            set_preference(self.db, 'WatchList', ", ".join(parse_callsigns(result)))
+            if self.poll_timer.isActive():
+                self.schedule.set_callsigns(get_watch_list(self.db))
+
+
+    def mnuMsgAutoPoll_toggled(self, checked: bool):
+        """Start or stop polling the watch list on a schedule.
+
+        Each call sign is polled on its own interval, between the PollFloor
+        and PollCeiling preferences (in seconds).
+        """
+
+        set_preference(self.db, 'AutoPoll', '1' if checked else '0')
+        if checked:
+            self.schedule.set_callsigns(get_watch_list(self.db))
+            self.poll_timer.start()
+            self.poll_tick()
+        else:
+            self.poll_timer.stop()
+            self.schedule.set_callsigns([])
+
+
+    def mnuMsgRetention_clicked(self):
+        """Allow the user to set how much message history is kept."""
+
+        policy = RetentionPolicy.from_preferences(self.db)
+        current = f"{policy.max_age_days:g}, {policy.max_messages}, {policy.max_per_callsign}"
+
+        result, ok = QInputDialog.getText(self,
+                                      "Briefpoint: Retention Policy",
+                                      "Keep messages for at most: days, messages, messages per call sign\n"
+                                      "(0 for no limit; older messages are deleted for good):",
+                                      text=current)
+        if not ok:
+            return
+
+        try:
+            days, messages, per_callsign = (field.strip() or '0' for field in result.split(','))
+            policy = RetentionPolicy(float(days), int(messages), int(per_callsign))
+            if min(policy.max_age_days, policy.max_messages, policy.max_per_callsign) < 0:
+                raise ValueError
+        except ValueError:
+            QMessageBox.warning(self, "Briefpoint: Retention Policy",
+                                "Enter three numbers separated by commas, such as 90, 100000, 0.")
+            return
+
+        policy.save(self.db)
+        self.ui.statusbar.showMessage(f"Retention policy: {policy.describe()}.")
+        self.start_retention()
+
+
+    def mnuMsgDatabaseSpace_clicked(self):
+        """Measure the database files on a pool thread; space_measured shows the result."""
+
+        if self.measuring or self.shutting_down:
+            return
+
+        self.measuring = True
+        self.ui.statusbar.showMessage("Measuring the database...")
+        worker = TaskWorker(self.db, self.db.space_stats)
+        worker.signals.finished.connect(self.space_measured)
+        worker.signals.failed.connect(self.space_failed)
+        self.threadpool.start(worker)
+
+
+    def space_failed(self, error: str):
+        self.measuring = False
+        self.ui.statusbar.showMessage(f'Measuring the database failed. "{error}"')
+
+
+    def space_measured(self, space: dict):
+        """Show how much of the database files is in use, and offer to compact them."""
+
+        self.measuring = False
+        self.ui.statusbar.showMessage("")
+        if self.shutting_down:
+            return
+
+        lines = []
+        for stats in (space['main'], space['archive']):
+            fragmentation = stats['fragmentation_percent']
+            lines.append(f"{os.path.basename(stats['file'])}: {stats['bytes'] / 1048576:.1f} MB\n"
+                         f"    free: {stats['free_pages']} pages, {stats['free_bytes'] / 1048576:.1f} MB "
+                         f"({stats['free_percent']:.1f}%)\n"
+                         f"    fragmentation: {'unavailable' if fragmentation is None else f'{fragmentation:.0f}%'}\n"
+                         f"    auto_vacuum: {stats['auto_vacuum']}")
+
+        # a file from an older version cannot release pages a step at a
+        # time until one full VACUUM converts it, which blocks every write
+        text = "\n\n".join(lines) + "\n\nRelease the free space now?"
+        if any(stats['auto_vacuum'] != 'incremental' for stats in space.values()):
+            text += ("\n\nA file without incremental auto_vacuum only gives space back after "
+                     "Rewrite Files. Fetches and acknowledgements wait until that is done.")
+
+        box = QMessageBox(QMessageBox.Question, "Briefpoint: Database Space", text,
+                          QMessageBox.Yes | QMessageBox.No, self)
+        rewrite = box.addButton("Rewrite Files", QMessageBox.ActionRole)
+        box.exec()
+        if box.clickedButton() is rewrite:
+            self.start_compaction(full=True)
+        elif box.clickedButton() is box.button(QMessageBox.Yes):
+            self.start_compaction()
+
+
+    def mnuMsgSearchArchive_toggled(self, checked: bool):
+        """Point the search box at the archive, or back at the messages"""
+
+        self.ui.txtSearch.setPlaceholderText("Search the archive" if checked else "Search messages")
+        self.model.set_archive(checked)
+        self.show_search_count()
         
 
 
@@ -333,15 +800,59 @@ class MainWindow(QMainWindow):
         
         This calls a companion method that closes the database and
         any open dialog boxes and terminates the application.
-        
-        For now, it just exits the application.
         """
 
-        # TODO: create a method that handles the graceful shutdown
+        self.shutdown()
         QApplication.processEvents()
         QApplication.quit()
 
 
+    def closeEvent(self, event):
+        """The window is closing some other way than File > Exit"""
+
+        self.shutdown()
+        super().closeEvent(event)
+
+
+    def shutdown(self):
+        """Stop the background work and release the database and network
+
+        Fetches already running are cancelled; a request on the wire
+        ends within its read timeout and nothing is left half written.
+        Then every thread's database connection is closed.
+        """
+
+        if self.shutting_down:
+            return
+        self.shutting_down = True
+
+        self.poll_timer.stop()
+        self.probe_timer.stop()
+        self.breaker_timer.stop()
+        self.archive_timer.stop()
+        self.retention_timer.stop()
+        self.compact_timer.stop()
+        self.write_startup_report()
+        self.ui.butFetch.setEnabled(False)
+        self.ui.butCancel.setEnabled(False)
+        for worker in set(self.fetches.values()):
+            worker.cancel()
+        if self.archiver is not None:
+            self.archiver.cancel()
+        if self.retainer is not None:
+            self.retainer.cancel()
+        if self.compactor is not None:
+            self.compactor.cancel()
+        self.threadpool.waitForDone(self.SHUTDOWN_WAIT_MS)
+
+        self.db.close()
+
+        # no request, no session to close
+        http_client = sys.modules.get('http_client')
+        if http_client is not None:
+            http_client.HttpClient().close()
+
+
 
 
 def main():
@@ -351,10 +862,28 @@ def main():
     # TODO: implement a way for the user to select a style
     # app.setStyle("Windows")
     app.setStyle("windowsvista")
+    STARTUP.mark('QApplication')
+
+    # the splash screen needs the logo, so the resources go in first
+    load_resources()
+    STARTUP.mark('resources')
+
+    # Splash Screen ============================================
+    pixmap = QPixmap(u":/Main/briefpoint_logo.png")
+    splash = QSplashScreen(pixmap)
+    splash.show()
+    QApplication.processEvents()
+    STARTUP.mark('splash')
 
     window = MainWindow()
+    STARTUP.mark('main window')
     # window.setWindowFlags(Qt.WindowType.Window)
     window.show()
+
+    # finish() waits for the window to be on screen, so call it after show()
+    splash.finish(window)
+    # End Splash Screen ============================================
+
     sys.exit(app.exec())
 
 
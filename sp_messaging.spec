@@ -5,7 +5,7 @@ a = Analysis(
     ['sp_messaging.py'],
     pathex=[],
     binaries=[],
-    datas=[('ui/icons.qrc', '.')],
+    datas=[('ui/icons.qrc', '.'), ('ui/icons.rcc', 'ui')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
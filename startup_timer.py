@@ -0,0 +1,220 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# startup_timer.py
+#
+# Wall-clock milestones from the start of sp_messaging to the first
+# paint of the main window, so changes to startup can be measured.
+# Import this module before anything else so the clock starts early.
+#
+# Profiling mode adds the time of every import and writes everything
+# as JSON, optionally with a cProfile dump of the startup:
+#
+#   python sp_messaging.py --profile[=startup.json] [--cprofile=startup.prof]
+#
+# or set BRIEFPOINT_PROFILE (1 or a file name) and BRIEFPOINT_CPROFILE.
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+import threading
+import builtins
+import sys
+import os
+import time
+
+PROFILE_FILE = "briefpoint_startup.json"
+
+
+def _process_start() -> float:
+    """When the operating system started this process, as a time.time()
+
+    Returns:
+    (float): the start time, or None where it cannot be found out
+    """
+
+    try:
+        if sys.platform.startswith('linux'):
+            with open('/proc/self/stat') as stat:
+                # the command name in field 2 may hold spaces, so count from its end
+                fields = stat.read().rsplit(')', 1)[1].split()
+            with open('/proc/stat') as stat:
+                boot = next(int(line.split()[1]) for line in stat if line.startswith('btime'))
+            return boot + int(fields[19]) / os.sysconf('SC_CLK_TCK')
+
+        if sys.platform == 'win32':
+            import ctypes
+            from ctypes import wintypes
+            creation, exited, kernel, user = (wintypes.FILETIME() for _ in range(4))
+            kernel32 = ctypes.windll.kernel32
+            if kernel32.GetProcessTimes(kernel32.GetCurrentProcess(), ctypes.byref(creation),
+                                        ctypes.byref(exited), ctypes.byref(kernel), ctypes.byref(user)):
+                # FILETIME counts 100 ns ticks since 1601-01-01
+                ticks = (creation.dwHighDateTime << 32) | creation.dwLowDateTime
+                return ticks / 1e7 - 11644473600
+    except (OSError, ValueError, IndexError, StopIteration, AttributeError):
+        pass
+
+    return None
+
+
+def _option(name: str, env: str) -> str:
+    """Take --name or --name=value off the command line, else read env
+
+    Returns:
+    (str): the value; '' for a bare --name; None if neither is given
+    """
+
+    for arg in list(sys.argv[1:]):
+        if arg == f'--{name}' or arg.startswith(f'--{name}='):
+            sys.argv.remove(arg)
+            return arg.partition('=')[2]
+    return os.environ.get(env)
+
+
+class StartupTimer:
+    """Named milestones, in seconds since the timer was created"""
+
+    def __init__(self, profile: str=None, cprofile: str=None):
+        """Start the clock
+
+        Parameters:
+        profile (str): file to write the JSON report to; None to only
+            keep the one-line report (optional)
+        cprofile (str): file to dump cProfile statistics to (optional)
+        """
+
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.marks = []     # (name, seconds since start)
+
+        self.profile = profile
+        self.imports = []   # {'module', 'thread', 'start', 'seconds', 'depth'}
+        self._depth = threading.local()     # import nesting, per thread
+        self._import = None
+        if profile:
+            self._import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+        self.cprofile = cprofile
+        self.profiler = None
+        if cprofile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+
+    @property
+    def profiling(self) -> bool:
+        """True if a JSON report or a cProfile dump was asked for"""
+
+        return bool(self.profile or self.cprofile)
+
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        """builtins.__import__, timing each module's first import"""
+
+        if level or name in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+
+        depth = getattr(self._depth, 'value', 0)
+        start = time.perf_counter()
+        self._depth.value = depth + 1
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            self._depth.value = depth
+            self.imports.append({'module': name,
+                                 'thread': threading.current_thread().name,
+                                 'start': start - self.start,
+                                 'seconds': time.perf_counter() - start,
+                                 'depth': depth})
+
+
+    def mark(self, name: str) -> float:
+        """Record a milestone
+
+        Parameters:
+        name (str): what has just finished
+
+        Returns:
+        (float): seconds since the timer was created
+        """
+
+        elapsed = time.perf_counter() - self.start
+        self.marks.append((name, elapsed))
+        return elapsed
+
+
+    def report(self) -> str:
+        """One line with each step's time and the total, in milliseconds"""
+
+        steps = []
+        previous = 0.0
+        for name, elapsed in self.marks:
+            steps.append(f"{name} {(elapsed - previous) * 1000:.0f} ms")
+            previous = elapsed
+        return f"Startup: {'; '.join(steps)}; total {previous * 1000:.0f} ms"
+
+
+    def finish_cprofile(self):
+        """Stop the profiler and dump its statistics, if it is running"""
+
+        if self.profiler is None:
+            return
+        self.profiler.disable()
+        self.profiler.dump_stats(self.cprofile)
+        self.profiler = None
+
+
+    def write_report(self):
+        """Write the JSON report, if profiling was asked for
+
+        Times are seconds since the timer started; the interpreter
+        start, where it can be found out, comes out negative.
+        """
+
+        if not self.profile:
+            return
+
+        import platform
+        import json
+
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+        milestones = []
+        process_start = _process_start()
+        if process_start is not None:
+            milestones.append({'name': 'interpreter start', 'seconds': process_start - self.started_at})
+        milestones.extend({'name': name, 'seconds': elapsed} for name, elapsed in self.marks)
+
+        report = {'started_at': self.started_at,
+                  'python': platform.python_version(),
+                  'platform': platform.platform(),
+                  'executable': sys.executable,
+                  'milestones': milestones,
+                  'imports': sorted(self.imports, key=lambda entry: entry['start']),
+                  'cprofile': self.cprofile}
+
+        with open(self.profile, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+def _from_command_line() -> StartupTimer:
+    """The timer for this run, in profiling mode if it was asked for"""
+
+    profile = _option('profile', 'BRIEFPOINT_PROFILE')
+    if profile in ('', '1'):
+        profile = PROFILE_FILE
+    elif profile == '0':
+        profile = None
+
+    return StartupTimer(profile=profile, cprofile=_option('cprofile', 'BRIEFPOINT_CPROFILE') or None)
+
+
+# the clock for this run of the application
+STARTUP = _from_command_line()
@@ -0,0 +1,144 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# tests/test_archive.py
+#
+# Checks that archive_messages moves every message exactly once, also
+# when the database was made anew next to an older archive, and that
+# flagging acked messages for deletion reaches the archive too.
+#
+#   python -m unittest discover tests
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aprs_api import archive_messages, flag_acked_for_purge, purge_messages
+from database import Database
+
+
+INSERT = """INSERT INTO APRSMessages (MsgID, MsgTime, MsgSource, MsgDest, MsgMessage, Acked, Purge)
+            VALUES (?, ?, 'N0CALL', 'N7TMS', ?, ?, ?);"""
+
+
+class ArchiveTest(unittest.TestCase):
+    """archive_messages and the purge flag against a real database"""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'archive.db')
+        self.db = Database(self.path, opening=True)
+
+
+    def tearDown(self):
+        self.db.close()
+        self.folder.cleanup()
+
+
+    def add(self, first: int, count: int, acked: int=0, purge: int=0):
+        """Store count messages with MsgIDs from first on"""
+
+        self.db.execute_many(INSERT, [(str(i), 1741262400 + i, f'message {i}', acked, purge)
+                                      for i in range(first, first + count)])
+
+
+    def msg_ids(self, table: str) -> set:
+        return {msg_id for msg_id, in self.db.fetch_all(f'SELECT MsgID FROM {table};', row_type='tuple')}
+
+
+    def archive(self, batch: int=50) -> list:
+        """archive_messages, given up on after 20 seconds"""
+
+        cancel = threading.Event()
+        timer = threading.Timer(20, cancel.set)
+        timer.start()
+        try:
+            moved = archive_messages(self.db, 30, batch=batch, cancel=cancel)
+        finally:
+            timer.cancel()
+        self.assertFalse(cancel.is_set(), "archive_messages did not finish")
+        return moved
+
+
+    def reopen_new_database(self):
+        """Delete the database file but keep its archive, as a user might"""
+
+        self.db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+        self.db = Database(self.path, opening=True)
+
+
+    def test_moves_every_purged_message(self):
+        self.add(0, 120, purge=1)
+        self.add(120, 30)
+        moved = self.archive()
+
+        self.assertEqual(len(moved), 120)
+        self.assertEqual(self.msg_ids('archive.APRSArchive'), {str(i) for i in range(120)})
+        self.assertEqual(self.msg_ids('APRSMessages'), {str(i) for i in range(120, 150)})
+
+
+    def test_new_database_numbers_past_the_archive(self):
+        self.add(0, 100, purge=1)
+        self.archive()
+        self.reopen_new_database()
+
+        self.add(100, 1)
+        midx = self.db.fetch_all('SELECT MIdx FROM APRSMessages;', row_type='tuple')[0][0]
+        self.assertGreater(midx, 100)
+
+
+    def test_colliding_midx_is_renumbered(self):
+        self.add(0, 100, purge=1)
+        self.archive()
+        self.reopen_new_database()
+
+        # a database from before the counter was carried over
+        self.db.execute_many("""INSERT INTO APRSMessages (MIdx, MsgID, MsgTime, MsgSource, MsgDest, MsgMessage, Acked, Purge)
+                                VALUES (?, ?, ?, 'N0CALL', 'N7TMS', 'again', 0, 1);""",
+                             [(i + 1, str(1000 + i), 1741270000 + i) for i in range(60)])
+        midxs = {midx for midx, in self.db.fetch_all('SELECT MIdx FROM APRSMessages;', row_type='tuple')}
+        moved = self.archive(batch=25)
+
+        self.assertEqual(set(moved), midxs)
+        self.assertEqual(self.msg_ids('APRSMessages'), set())
+        self.assertEqual(len(self.msg_ids('archive.APRSArchive')), 160)
+
+
+    def test_already_archived_message_is_only_deleted(self):
+        self.add(0, 10, purge=1)
+        self.archive()
+        # fetched again before the store skipped archived MsgIDs
+        self.db.execute_many(INSERT, [('3', 1741262403, 'message 3', 0, 1)])
+        moved = self.archive()
+
+        self.assertEqual(len(moved), 1)
+        self.assertEqual(self.msg_ids('APRSMessages'), set())
+        self.assertEqual(self.db.fetch_all('SELECT count(*) FROM archive.APRSArchive;', row_type='tuple')[0][0], 10)
+
+
+    def test_flagging_acked_reaches_the_archive(self):
+        self.add(0, 5, acked=1)
+        self.add(5, 5)
+        self.db.execute_query('UPDATE APRSMessages SET MsgTime = 0 WHERE Acked = 1;')
+        self.archive()
+        self.db.execute_query("UPDATE APRSMessages SET Acked = 1 WHERE MsgID = '5';")
+
+        self.assertEqual(flag_acked_for_purge(self.db), 6)
+        self.assertEqual(purge_messages(self.db), 6)
+        self.assertEqual(self.msg_ids('archive.APRSArchive'), set())
+        self.assertEqual(self.msg_ids('APRSMessages'), {str(i) for i in range(6, 10)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+##############################################################################
+# Spurpoint Messaging (Briefpoint)
+#
+# tests/test_query_plan.py
+#
+# Checks that the message list's keyset queries, as the model issues
+# them, are served by idx_APRSMessages_List without a sort.
+#
+#   python -m unittest discover tests
+#
+# Creator: Todd Smith
+# Start Date: 2025-03-06
+#
+##############################################################################
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import Database
+from message_model import MessageTableModel
+
+
+class QueryPlanTest(unittest.TestCase):
+    """EXPLAIN QUERY PLAN for each of the model's key queries"""
+
+    INDEX = 'idx_APRSMessages_List'
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.folder.name, 'plan.db'), opening=True)
+
+        # enough rows, some acked, for the statistics to mean something
+        rows = [(str(i), 1741262400 + i, 'N0CALL', f'N{i % 7}CALL', f'message {i}', i % 3 == 0)
+                for i in range(2000)]
+        self.db.execute_many("""INSERT INTO APRSMessages (MsgID, MsgTime, MsgSource, MsgDest, MsgMessage, Acked, Purge)
+                                VALUES (?, ?, ?, ?, ?, ?, 0);""", rows)
+        self.db.optimize()
+        self.model = MessageTableModel(self.db)
+
+
+    def tearDown(self):
+        self.db.close()
+        self.folder.cleanup()
+
+
+    def plan(self, qry: str, params: list) -> list:
+        """The details of EXPLAIN QUERY PLAN for a query"""
+
+        return [row['detail'] for row in self.db.fetch_all('EXPLAIN QUERY PLAN ' + qry, params)]
+
+
+    def check_pages(self, showall: bool, last_key: tuple):
+        """The first page and a following page both seek the list index"""
+
+        self.model.showall = showall
+        for keys in ([], [last_key]):
+            self.model._keys = keys
+            with self.subTest(showall=showall, paging=bool(keys)):
+                plan = self.plan(*self.model._next_keys_query())
+                self.assertTrue(any(f'COVERING INDEX {self.INDEX}' in step for step in plan), plan)
+                self.assertFalse(any('TEMP B-TREE' in step for step in plan), plan)
+
+
+    def test_unacked_pages(self):
+        self.check_pages(False, (1741262500, 100))
+
+
+    def test_show_all_pages(self):
+        self.check_pages(True, (0, 1741262500, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
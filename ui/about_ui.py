@@ -18,8 +18,6 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
 from PySide6.QtWidgets import (QApplication, QDialog, QHBoxLayout, QLabel,
     QPushButton, QSizePolicy, QSpacerItem, QVBoxLayout,
     QWidget)
-import ui.icons_rc
-
 class Ui_dlgAbout(object):
     def setupUi(self, dlgAbout):
         if not dlgAbout.objectName():
@@ -18,10 +18,8 @@ from PySide6.QtGui import (QAction, QBrush, QColor, QConicalGradient,
     QTransform)
 from PySide6.QtWidgets import (QApplication, QGridLayout, QGroupBox, QHeaderView,
     QLineEdit, QMainWindow, QMenu, QMenuBar,
-    QPushButton, QSizePolicy, QSpacerItem, QStatusBar,
-    QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget)
-import ui.icons_rc
-
+    QPushButton, QSizePolicy, QStatusBar, QTableView,
+    QVBoxLayout, QWidget)
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         if not MainWindow.objectName():
@@ -45,6 +43,18 @@ class Ui_MainWindow(object):
         self.actionPurge_ALL_Messages.setObjectName(u"actionPurge_ALL_Messages")
         self.actionEnter_APRS_API_Key = QAction(MainWindow)
         self.actionEnter_APRS_API_Key.setObjectName(u"actionEnter_APRS_API_Key")
+        self.actionEdit_Watch_List = QAction(MainWindow)
+        self.actionEdit_Watch_List.setObjectName(u"actionEdit_Watch_List")
+        self.actionAuto_Poll = QAction(MainWindow)
+        self.actionAuto_Poll.setObjectName(u"actionAuto_Poll")
+        self.actionAuto_Poll.setCheckable(True)
+        self.actionSearch_Archive = QAction(MainWindow)
+        self.actionSearch_Archive.setObjectName(u"actionSearch_Archive")
+        self.actionSearch_Archive.setCheckable(True)
+        self.actionRetention_Policy = QAction(MainWindow)
+        self.actionRetention_Policy.setObjectName(u"actionRetention_Policy")
+        self.actionDatabase_Space = QAction(MainWindow)
+        self.actionDatabase_Space.setObjectName(u"actionDatabase_Space")
         self.centralwidget = QWidget(MainWindow)
         self.centralwidget.setObjectName(u"centralwidget")
         self.gridLayout_2 = QGridLayout(self.centralwidget)
@@ -63,7 +73,7 @@ class Ui_MainWindow(object):
         self.butClose = QPushButton(self.groupBoxInputs)
         self.butClose.setObjectName(u"butClose")
 
-        self.gridLayout.addWidget(self.butClose, 0, 4, 1, 1)
+        self.gridLayout.addWidget(self.butClose, 0, 5, 1, 1)
 
         self.txtCallsign = QLineEdit(self.groupBoxInputs)
         self.txtCallsign.setObjectName(u"txtCallsign")
@@ -75,19 +85,27 @@ class Ui_MainWindow(object):
 
         self.gridLayout.addWidget(self.butFetch, 0, 1, 1, 1)
 
-        self.horizontalSpacer = QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
+        self.txtSearch = QLineEdit(self.groupBoxInputs)
+        self.txtSearch.setObjectName(u"txtSearch")
+        self.txtSearch.setClearButtonEnabled(True)
+
+        self.gridLayout.addWidget(self.txtSearch, 0, 4, 1, 1)
+
+        self.butCancel = QPushButton(self.groupBoxInputs)
+        self.butCancel.setObjectName(u"butCancel")
+        self.butCancel.setEnabled(False)
 
-        self.gridLayout.addItem(self.horizontalSpacer, 0, 3, 1, 1)
+        self.gridLayout.addWidget(self.butCancel, 0, 2, 1, 1)
 
         self.butShowAll = QPushButton(self.groupBoxInputs)
         self.butShowAll.setObjectName(u"butShowAll")
 
-        self.gridLayout.addWidget(self.butShowAll, 0, 2, 1, 1)
+        self.gridLayout.addWidget(self.butShowAll, 0, 3, 1, 1)
 
 
         self.verticalLayout.addWidget(self.groupBoxInputs)
 
-        self.tblMessages = QTableWidget(self.groupBoxTitle)
+        self.tblMessages = QTableView(self.groupBoxTitle)
         self.tblMessages.setObjectName(u"tblMessages")
 
         self.verticalLayout.addWidget(self.tblMessages)
@@ -108,8 +126,10 @@ class Ui_MainWindow(object):
         self.statusbar.setObjectName(u"statusbar")
         MainWindow.setStatusBar(self.statusbar)
         QWidget.setTabOrder(self.txtCallsign, self.butFetch)
-        QWidget.setTabOrder(self.butFetch, self.butShowAll)
-        QWidget.setTabOrder(self.butShowAll, self.butClose)
+        QWidget.setTabOrder(self.butFetch, self.butCancel)
+        QWidget.setTabOrder(self.butCancel, self.butShowAll)
+        QWidget.setTabOrder(self.butShowAll, self.txtSearch)
+        QWidget.setTabOrder(self.txtSearch, self.butClose)
         QWidget.setTabOrder(self.butClose, self.tblMessages)
 
         self.menubar.addAction(self.menuFile.menuAction())
@@ -120,8 +140,13 @@ class Ui_MainWindow(object):
         self.menuFile.addAction(self.actionExit)
         self.menuMessages.addAction(self.actionPurge_Selected_Messages)
         self.menuMessages.addAction(self.actionPurge_ALL_Messages)
+        self.menuMessages.addAction(self.actionSearch_Archive)
+        self.menuMessages.addAction(self.actionRetention_Policy)
+        self.menuMessages.addAction(self.actionDatabase_Space)
         self.menuMessages.addSeparator()
         self.menuMessages.addAction(self.actionEnter_APRS_API_Key)
+        self.menuMessages.addAction(self.actionEdit_Watch_List)
+        self.menuMessages.addAction(self.actionAuto_Poll)
 
         self.retranslateUi(MainWindow)
 
@@ -136,11 +161,18 @@ class Ui_MainWindow(object):
         self.actionPurge_Selected_Messages.setText(QCoreApplication.translate("MainWindow", u"Delete ACK'd Messages", None))
         self.actionPurge_ALL_Messages.setText(QCoreApplication.translate("MainWindow", u"Purge Deleted Messages", None))
         self.actionEnter_APRS_API_Key.setText(QCoreApplication.translate("MainWindow", u"Enter APRS API Key", None))
+        self.actionEdit_Watch_List.setText(QCoreApplication.translate("MainWindow", u"Edit Watch List", None))
+        self.actionAuto_Poll.setText(QCoreApplication.translate("MainWindow", u"Auto Poll Watch List", None))
+        self.actionSearch_Archive.setText(QCoreApplication.translate("MainWindow", u"Search Archive", None))
+        self.actionRetention_Policy.setText(QCoreApplication.translate("MainWindow", u"Retention Policy", None))
+        self.actionDatabase_Space.setText(QCoreApplication.translate("MainWindow", u"Database Space", None))
         self.groupBoxTitle.setTitle(QCoreApplication.translate("MainWindow", u"APRS Message Handler", None))
         self.groupBoxInputs.setTitle("")
         self.butClose.setText(QCoreApplication.translate("MainWindow", u"Close", None))
         self.txtCallsign.setPlaceholderText(QCoreApplication.translate("MainWindow", u"Call Sign", None))
         self.butFetch.setText(QCoreApplication.translate("MainWindow", u"Fetch Messages", None))
+        self.txtSearch.setPlaceholderText(QCoreApplication.translate("MainWindow", u"Search messages", None))
+        self.butCancel.setText(QCoreApplication.translate("MainWindow", u"Cancel", None))
         self.butShowAll.setText(QCoreApplication.translate("MainWindow", u"Show All", None))
         self.menuFile.setTitle(QCoreApplication.translate("MainWindow", u"File", None))
         self.menuMessages.setTitle(QCoreApplication.translate("MainWindow", u"Messages", None))